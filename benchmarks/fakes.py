@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from rag.local_vector_store import LocalVectorIndex
+
+
+class FakeLLM(CustomLLM):
+    """
+    Deterministic stand-in for the Groq client. Answers with the JSON shape the
+    calling prompt asks for, referencing the first table found in the context.
+    """
+
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="fake-llm")
+
+    def _answer(self, prompt: str) -> str:
+        self.calls += 1
+        match = re.search(r"Table `([^`]+)`", prompt)
+        table = match.group(1) if match else "orders"
+        if "recommendation" in prompt.lower():
+            return json.dumps({"recommendations": [
+                {"question": f"How many rows are in {table}?", "sql": f"SELECT COUNT(*) FROM {table};"},
+                {"question": f"Show the latest rows of {table}.", "sql": f"SELECT * FROM {table} LIMIT 10;"},
+            ]})
+        return json.dumps({
+            "sql": f"SELECT * FROM {table} LIMIT 100;",
+            "explanation": f"Reads rows from {table}.",
+            "source_tables": [table],
+        })
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency)
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self._answer(prompt))
+
+    @staticmethod
+    def _tokens(text: str):
+        return re.findall(r"\S+\s*", text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        text = self.complete(prompt, formatted=formatted).text
+
+        def gen():
+            emitted = ""
+            for token in self._tokens(text):
+                emitted += token
+                yield CompletionResponse(text=emitted, delta=token)
+
+        return gen()
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        # Half the latency before the first token, the rest spread over the tokens.
+        text = self._answer(prompt)
+        tokens = self._tokens(text)
+        await asyncio.sleep(self.latency / 2)
+
+        async def gen():
+            emitted = ""
+            for token in tokens:
+                await asyncio.sleep(self.latency / 2 / len(tokens))
+                emitted += token
+                yield CompletionResponse(text=emitted, delta=token)
+
+        return gen()
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Hash-seeded random unit vectors; one simulated round trip per call or batch."""
+
+    dim: int = 256
+    latency: float = 0.0
+    calls: int = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+
+class SlowVectorIndex(LocalVectorIndex):
+    """LocalVectorIndex with a simulated network round trip on every call, like Pinecone."""
+
+    def __init__(self, path: str, latency: float = 0.0):
+        super().__init__(path)
+        self.latency = latency
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def describe_index_stats(self, **kwargs):
+        self._round_trip()
+        return super().describe_index_stats(**kwargs)
+
+    def upsert(self, vectors, namespace: str = None, **kwargs):
+        self._round_trip()
+        return super().upsert(vectors, namespace=namespace, **kwargs)
+
+    def query(self, vector, **kwargs):
+        self._round_trip()
+        return super().query(vector, **kwargs)
+
+    def fetch(self, ids, namespace: str = None, **kwargs):
+        self._round_trip()
+        return super().fetch(ids, namespace=namespace, **kwargs)
+
+    def list(self, **kwargs):
+        self._round_trip()
+        return super().list(**kwargs)
+
+    def delete(self, **kwargs):
+        self._round_trip()
+        return super().delete(**kwargs)
+
+
+# --- asyncpg-compatible fake database ---
+
+RESULT_COLUMNS = ("id", "name", "amount", "active")
+SCHEMA_COLUMN_TYPES = ("integer", "text", "numeric", "boolean", "timestamp without time zone", "character varying")
+
+
+def _result_row(i: int):
+    return (i, f"name_{i}", i * 0.5, i % 2 == 0)
+
+
+class _Attribute:
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeCursor:
+    def __init__(self, database, rows_total):
+        self.database = database
+        self.position = 0
+        self.rows_total = rows_total
+
+    async def forward(self, n):
+        self.position = min(self.rows_total, self.position + n)
+
+    async def fetch(self, n):
+        await self.database.round_trip()
+        start, self.position = self.position, min(self.rows_total, self.position + n)
+        return [_result_row(i) for i in range(start, self.position)]
+
+
+class _FakeStatement:
+    def __init__(self, database, query):
+        self.database = database
+        self.query = query
+        self.columns, self.produce = database.plan(query)
+
+    def get_attributes(self):
+        return [_Attribute(name) for name in self.columns]
+
+    async def fetch(self, *params):
+        await self.database.round_trip()
+        return self.produce(params)
+
+    async def cursor(self, *params, prefetch=None):
+        # Only ad-hoc result queries are streamed, so the row count is all we need.
+        return _FakeCursor(self.database, self.database.result_rows(self.query))
+
+
+class _FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    async def prepare(self, query):
+        return _FakeStatement(self.database, query)
+
+    async def fetch(self, query, *params):
+        return await (await self.prepare(query)).fetch(*params)
+
+    async def execute(self, query, *params):
+        await self.database.round_trip()
+        return "SELECT 1"
+
+    @asynccontextmanager
+    async def _transaction(self):
+        yield
+
+    def transaction(self):
+        return self._transaction()
+
+
+class FakePool:
+    def __init__(self, database, max_size):
+        self.database = database
+        self._slots = asyncio.Semaphore(max_size)
+        self._max_size = max_size
+        self._busy = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._slots:
+            self._busy += 1
+            try:
+                yield _FakeConnection(self.database)
+            finally:
+                self._busy -= 1
+
+    async def close(self):
+        pass
+
+    def get_size(self):
+        return self._max_size
+
+    def get_idle_size(self):
+        return self._max_size - self._busy
+
+
+class FakeDatabase:
+    """
+    In-memory PostgreSQL catalog of `table_count` tables answering the catalog
+    queries ExtractSchema issues. Any other query returns generated rows; its
+    `LIMIT n` clause sets the row count, defaulting to `default_rows`.
+    """
+
+    def __init__(self, table_count: int = 100, columns_per_table: int = 12,
+                 default_rows: int = 1000, latency: float = 0.0):
+        self.table_names = [f"table_{i:05d}" for i in range(table_count)]
+        self.columns_per_table = columns_per_table
+        self.default_rows = default_rows
+        self.latency = latency
+        self.statements = 0
+
+    async def round_trip(self):
+        self.statements += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def result_rows(self, query: str) -> int:
+        match = re.search(r"\bLIMIT\s+(\d+)", query, re.IGNORECASE)
+        return int(match.group(1)) if match else self.default_rows
+
+    def _columns_for(self, table_name):
+        rows = []
+        for i in range(self.columns_per_table):
+            rows.append((
+                table_name,
+                "id" if i == 0 else f"{table_name}_col_{i}",
+                SCHEMA_COLUMN_TYPES[i % len(SCHEMA_COLUMN_TYPES)],
+                "NO" if i == 0 else "YES",
+                255 if i % len(SCHEMA_COLUMN_TYPES) == 5 else None,
+                32 if i % len(SCHEMA_COLUMN_TYPES) == 0 else None,
+                0 if i % len(SCHEMA_COLUMN_TYPES) == 0 else None,
+                "PRIMARY KEY" if i == 0 else None,
+                f"nextval('{table_name}_id_seq'::regclass)" if i == 0 else None,
+            ))
+        return rows
+
+    def plan(self, query: str):
+        """Returns (column names, params -> rows) for one statement."""
+        if query.lstrip().upper().startswith("EXPLAIN"):
+            rows_total = self.result_rows(query)
+            plan = [{"Plan": {"Node Type": "Seq Scan", "Total Cost": rows_total * 0.01, "Plan Rows": rows_total}}]
+            return ["QUERY PLAN"], lambda params: [(json.dumps(plan),)]
+        if "information_schema.columns" in query:
+            columns = ["table_name", "column_name", "data_type", "is_nullable", "character_maximum_length",
+                       "numeric_precision", "numeric_scale", "constraint_type", "column_default"]
+            return columns, lambda params: [row for name in params[0] for row in self._columns_for(name)]
+        if "pg_catalog.pg_class" in query:
+            digest = hashlib.md5(",".join(self.table_names).encode()).hexdigest()
+            return ["count", "md5"], lambda params: [(len(self.table_names), digest)]
+        if "information_schema.tables" in query:
+            return ["table_name"], lambda params: [(name,) for name in self.table_names]
+        rows_total = self.result_rows(query)
+        return list(RESULT_COLUMNS), lambda params: [_result_row(i) for i in range(rows_total)]
+
+    def install(self, pool_manager):
+        """Makes `pool_manager` hand out connections to this database instead of real drivers."""
+        async def create_pool(db_type, host, port, user, password, database):
+            return FakePool(self, pool_manager.max_size)
+        pool_manager._create_pool = create_pool
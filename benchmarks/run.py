@@ -0,0 +1,294 @@
+"""
+Offline benchmark for the hot API paths.
+
+Drives the FastAPI app in-process with deterministic fakes for the LLM, the
+embedding models, the vector index and the PostgreSQL driver, and reports
+throughput, p50/p99 latency and peak traced memory per scenario:
+
+    python -m benchmarks.run --tables 10,200,2000 --rows 1000,100000,1000000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_workdir = tempfile.mkdtemp(prefix="aurasql-bench-")
+# Configuration is read at import time, so it has to be pinned before the app loads.
+os.environ["VECTOR_STORE_BACKEND"] = "local"
+os.environ["LOCAL_VECTOR_STORE_PATH"] = os.path.join(_workdir, "vectors")
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import controller.main as server
+from benchmarks.fakes import FakeDatabase, FakeEmbedding, FakeLLM, SlowVectorIndex
+from db.pool import pool_manager
+
+SCENARIOS = ("context", "query", "query_stream", "query_batch", "recommendations", "query_sql")
+SQL_FORMATS = ("records", "columnar", "arrow", "stream")
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+CONNECTION = {
+    "db_type": "postgresql",
+    "ip": "bench.local",
+    "port": 5432,
+    "username": "bench",
+    "password": "bench",
+    "database": "bench",
+    "schema_name": "public",
+}
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(name, params, operation, requests, concurrency):
+    """Runs `operation(i)` `requests` times with bounded concurrency and summarises it."""
+    latencies, errors = [], []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await operation(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(str(e))
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline if tracing else 0
+
+    latencies.sort()
+    result = {
+        "scenario": name,
+        **params,
+        "requests": requests,
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "peak_mib": round(peak / 2**20, 2),
+    }
+    if errors:
+        result["first_error"] = errors[0]
+    print(_format_row(result), flush=True)
+    return result
+
+
+def _format_row(result):
+    params = " ".join(f"{key}={result[key]}" for key in ("tables", "rows", "format") if key in result)
+    return (
+        f"{result['scenario']:<16} {params:<32} n={result['requests']:<5} err={result['errors']:<3} "
+        f"{result['throughput_rps']:>9} req/s  p50={result['p50_ms']:>9} ms  "
+        f"p99={result['p99_ms']:>9} ms  peak={result['peak_mib']:>8} MiB"
+    )
+
+
+class Bench:
+    def __init__(self, client, database, args):
+        self.client = client
+        self.database = database
+        self.args = args
+        self._context_runs = 0
+
+    async def _post(self, path, payload):
+        response = await self.client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    async def create_context(self, table_names):
+        """Creates a context and waits for its background indexing job."""
+        response = await self._post(
+            "/create_multitable_context", {**CONNECTION, "table_names": table_names}
+        )
+        body = response.json()
+        job = await server.app_state["job_manager"].wait(body["job_id"])
+        if job["status"] != "completed":
+            raise RuntimeError(f"Indexing job {body['job_id']} ended as {job['status']}: {job.get('error')}")
+        return body["namespace_id"]
+
+    def _table_slice(self, tables):
+        # Each run indexes a fresh table set so nothing is served from earlier runs.
+        offset = self._context_runs * tables
+        self._context_runs += 1
+        names = self.database.table_names
+        return [names[(offset + i) % len(names)] for i in range(tables)]
+
+    async def context(self, tables):
+        async def operation(i):
+            await self.create_context(self._table_slice(tables))
+        return await run_scenario(
+            "context", {"tables": tables}, operation, self.args.context_requests, self.args.concurrency
+        )
+
+    async def query(self, tables):
+        namespace_id = await self.create_context(self._table_slice(tables))
+
+        async def operation(i):
+            await self._post("/query", {
+                "query": f"How many orders were placed in region {i} last month?",
+                "namespace_id": namespace_id,
+            })
+        return await run_scenario("query", {"tables": tables}, operation, self.args.requests, self.args.concurrency)
+
+    async def query_stream(self, tables):
+        namespace_id = await self.create_context(self._table_slice(tables))
+
+        async def operation(i):
+            response = await self._post("/query/stream", {
+                "query": f"How many orders were shipped to region {i} last month?",
+                "namespace_id": namespace_id,
+            })
+            if "event: result" not in response.text:
+                raise RuntimeError(f"stream ended without a result: {response.text[-200:]}")
+        return await run_scenario(
+            "query_stream", {"tables": tables}, operation, self.args.requests, self.args.concurrency
+        )
+
+    async def query_batch(self, tables):
+        namespace_id = await self.create_context(self._table_slice(tables))
+        size = self.args.batch_size
+
+        async def operation(i):
+            response = await self._post("/query_batch", {
+                "questions": [f"What was the revenue of store {i * size + j} last week?" for j in range(size)],
+                "namespace_id": namespace_id,
+            })
+            done = json.loads(response.text.strip().splitlines()[-1])
+            if done.get("succeeded") != size:
+                raise RuntimeError(f"batch incomplete: {done}")
+        return await run_scenario(
+            "query_batch", {"tables": tables}, operation, self.args.batch_requests, self.args.concurrency
+        )
+
+    async def recommendations(self, tables):
+        namespace_id = await self.create_context(self._table_slice(tables))
+
+        async def operation(i):
+            await self._post("/recommendations", {"namespace_id": namespace_id, "refresh": True})
+        return await run_scenario(
+            "recommendations", {"tables": tables}, operation, self.args.requests, self.args.concurrency
+        )
+
+    async def query_sql(self, rows, result_format):
+        payload = {
+            **CONNECTION,
+            "table_name": "",
+            "query": f"SELECT id, name, amount, active FROM bench_rows LIMIT {rows}",
+        }
+        if result_format == "stream":
+            payload["stream"] = True
+        else:
+            payload["format"] = result_format
+
+        async def operation(i):
+            response = await self._post("/query_sql", payload)
+            if result_format == "stream" and '"done": true' not in response.text[-200:]:
+                raise RuntimeError("stream did not complete")
+        return await run_scenario(
+            "query_sql", {"rows": rows, "format": result_format}, operation,
+            self.args.sql_requests, self.args.concurrency,
+        )
+
+
+async def main(args):
+    llm = FakeLLM(latency=args.llm_latency)
+    embed_model = FakeEmbedding(latency=args.embed_latency)
+    database = FakeDatabase(
+        table_count=max(args.tables) * (args.context_requests + 2),
+        columns_per_table=args.columns,
+        latency=args.db_latency,
+    )
+    database.install(pool_manager)
+    server.get_vector_index = lambda: SlowVectorIndex(
+        os.environ["LOCAL_VECTOR_STORE_PATH"], latency=args.vector_latency
+    )
+    server.get_llm = lambda: llm
+    server.get_embed_model_doc = lambda: embed_model
+    server.get_embed_model_query = lambda: embed_model
+
+    results = []
+    if args.trace_memory:
+        tracemalloc.start()
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            bench = Bench(client, database, args)
+            for scenario in args.scenarios:
+                if scenario == "query_sql":
+                    for rows in args.rows:
+                        for result_format in args.formats:
+                            results.append(await bench.query_sql(rows, result_format))
+                else:
+                    for tables in args.tables:
+                        results.append(await getattr(bench, scenario)(tables))
+    if args.trace_memory:
+        tracemalloc.stop()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS),
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--tables", type=_int_list, default=[10, 100, 500],
+                        help="schema sizes (tables per context)")
+    parser.add_argument("--columns", type=int, default=12, help="columns per table")
+    parser.add_argument("--rows", type=_int_list, default=[1000, 10000, 100000],
+                        help="result sizes for /query_sql")
+    parser.add_argument("--formats", type=lambda v: v.split(","), default=list(SQL_FORMATS),
+                        help=f"comma-separated subset of {','.join(SQL_FORMATS)}")
+    parser.add_argument("--requests", type=int, default=50, help="requests per /query and /recommendations run")
+    parser.add_argument("--context-requests", type=int, default=3, help="requests per context run")
+    parser.add_argument("--batch-requests", type=int, default=5, help="requests per /query_batch run")
+    parser.add_argument("--batch-size", type=int, default=20, help="questions per /query_batch request")
+    parser.add_argument("--sql-requests", type=int, default=10, help="requests per /query_sql run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per embedding call or batch")
+    parser.add_argument("--vector-latency", type=float, default=0.005, help="seconds per vector index call")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per database round trip")
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                        help="skip tracemalloc, which slows allocation-heavy paths, for cleaner timings")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(main(args))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
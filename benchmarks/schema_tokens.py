@@ -0,0 +1,66 @@
+"""
+Tokens and vectors per table, comparing the former JSON rendering of the
+extracted columns, chunked by SentenceSplitter, with the nodes insert_schema
+builds (one table vector plus column groups of SCHEMA_COLUMN_CHUNK_TOKENS):
+
+    python -m benchmarks.schema_tokens --columns 12,50,200
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import Document
+from llama_index.core.node_parser import SentenceSplitter
+
+from benchmarks.fakes import FakeDatabase
+from rag.schema_index import build_table_nodes
+from rag.schema_text import count_tokens
+
+COLUMN_KEYS = ("column_name", "data_type", "is_nullable", "character_maximum_length",
+               "numeric_precision", "numeric_scale", "constraint_type", "column_default")
+
+
+def _table_columns(database, table_name):
+    return [dict(zip(COLUMN_KEYS, row[1:])) for row in database._columns_for(table_name)]
+
+
+def measure(columns_per_table: int, text_splitter: SentenceSplitter):
+    database = FakeDatabase(table_count=1, columns_per_table=columns_per_table)
+    table_name = database.table_names[0]
+    columns = _table_columns(database, table_name)
+    json_text = f"Table `{table_name}`: {json.dumps(columns)}"
+    _, nodes = build_table_nodes(table_name, columns)
+    result = {
+        "columns": columns_per_table,
+        "json_tokens": count_tokens(json_text),
+        "json_chunks": len(text_splitter.get_nodes_from_documents([Document(text=json_text)])),
+        "compact_tokens": sum(count_tokens(node.get_content()) for node in nodes),
+        "compact_chunks": len(nodes),
+    }
+    result["token_reduction"] = round(1 - result["compact_tokens"] / result["json_tokens"], 3)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--columns", type=lambda v: [int(item) for item in v.split(",") if item],
+                        default=[12, 50, 200], help="columns per table")
+    args = parser.parse_args(argv)
+    # Splitter settings insert_schema used for the JSON documents.
+    text_splitter = SentenceSplitter(chunk_size=1536, chunk_overlap=100)
+    for columns in args.columns:
+        result = measure(columns, text_splitter)
+        print(
+            f"columns={result['columns']:<5} json={result['json_tokens']:>6} tokens/{result['json_chunks']} chunks  "
+            f"compact={result['compact_tokens']:>6} tokens/{result['compact_chunks']} vectors  "
+            f"-{result['token_reduction']:.0%}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
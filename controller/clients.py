@@ -1,19 +1,41 @@
 import pinecone
 from llama_index.llms.groq import Groq
 from llama_index.embeddings.cohere import CohereEmbedding
+from rag.local_vector_store import LocalVectorIndex
+from rag.embedding_cache import CachedEmbedding, get_embedding_store
 from utils.config import (
     PINECONE_API_KEY,
     PINECONE_INDEX_NAME,
+    VECTOR_STORE_BACKEND,
+    LOCAL_VECTOR_STORE_PATH,
+    WEB_CONCURRENCY,
     GROQ_MODEL,
     GROQ_API_KEY,
     COHERE_API_KEY,
     COHERE_EMBED_MODEL_DOC,
     COHERE_EMBED_MODEL_QUERY,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBED_BATCH_SIZE,
 )
 
 def get_pinecone_index():
     return pinecone.Pinecone(api_key=PINECONE_API_KEY).Index(PINECONE_INDEX_NAME)
 
+def get_vector_index():
+    """Returns the configured Pinecone-compatible index (remote Pinecone or local NumPy)."""
+    if VECTOR_STORE_BACKEND == "local":
+        # Each worker would hold its own copy and rewrite the shared .npy files.
+        if WEB_CONCURRENCY > 1:
+            raise ValueError(
+                "VECTOR_STORE_BACKEND=local supports a single worker; "
+                "set WEB_CONCURRENCY=1 or use VECTOR_STORE_BACKEND=pinecone."
+            )
+        return LocalVectorIndex(LOCAL_VECTOR_STORE_PATH)
+    if VECTOR_STORE_BACKEND == "pinecone":
+        return get_pinecone_index()
+    raise ValueError(f"Unsupported vector store backend: {VECTOR_STORE_BACKEND}")
+
 def get_llm():
     return Groq(
         model=GROQ_MODEL,
@@ -24,12 +46,22 @@ def get_llm():
         stream=False,
     )
 
+def _with_embedding_cache(embed_model):
+    if not EMBEDDING_CACHE_ENABLED:
+        return embed_model
+    return CachedEmbedding(embed_model, get_embedding_store(EMBEDDING_CACHE_PATH))
+
+# llama_index splits batches into embed_batch_size requests (default 10); Cohere
+# accepts up to 96 texts per call, so batches are sized to EMBED_BATCH_SIZE instead.
+
 def get_embed_model_doc():
-    return CohereEmbedding(
-        api_key=COHERE_API_KEY, model_name=COHERE_EMBED_MODEL_DOC, input_type="search_document"
-    )
+    return _with_embedding_cache(CohereEmbedding(
+        api_key=COHERE_API_KEY, model_name=COHERE_EMBED_MODEL_DOC, input_type="search_document",
+        embed_batch_size=EMBED_BATCH_SIZE,
+    ))
 
 def get_embed_model_query():
-    return CohereEmbedding(
-        api_key=COHERE_API_KEY, model_name=COHERE_EMBED_MODEL_QUERY, input_type="search_query"
-    )
+    return _with_embedding_cache(CohereEmbedding(
+        api_key=COHERE_API_KEY, model_name=COHERE_EMBED_MODEL_QUERY, input_type="search_query",
+        embed_batch_size=EMBED_BATCH_SIZE,
+    ))
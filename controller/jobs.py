@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache_tier import CacheTier, MemoryCacheTier
+from utils.config import INDEXING_WORKERS, JOB_HISTORY_LIMIT, JOB_STATUS_TTL
+
+
+class _Progress(dict):
+    """Progress counters that publish the owning job's snapshot on every update."""
+
+    def __init__(self, publish, initial):
+        super().__init__(initial)
+        self._publish = publish
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._publish()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._publish()
+
+
+class JobManager:
+    """
+    Runs blocking work (schema embedding and upserts) on a thread pool so the
+    event loop keeps serving requests, and keeps a bounded history of job status.
+    Snapshots are also published to the shared cache tier so any worker can
+    answer status requests.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = INDEXING_WORKERS,
+        history_limit: int = JOB_HISTORY_LIMIT,
+        tier: CacheTier = None,
+    ):
+        self.tier = tier or MemoryCacheTier()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="indexing")
+        self._history_limit = history_limit
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    async def submit(self, kind: str, fn, *, namespace: str, progress: dict = None, **kwargs) -> str:
+        """Queues fn(namespace=..., progress=..., **kwargs) and returns the new job ID immediately."""
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "namespace": namespace,
+            "status": "queued",
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        job["progress"] = _Progress(lambda: self._publish(job), progress or {})
+        # Later updates are published from the indexing threads; this first one
+        # runs on the event loop, so it goes through the async tier calls.
+        try:
+            await self.tier.aset_json(f"job:{job_id}", self._snapshot(job), ttl=JOB_STATUS_TTL)
+            # The latest job per namespace decides whether that namespace can be queried.
+            await self.tier.aset(f"namespace_job:{namespace}", job_id, ttl=JOB_STATUS_TTL)
+        except Exception as e:
+            logging.warning(f"Could not publish job {job_id} of namespace {namespace}: {e}")
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+            self._futures[job_id] = self._executor.submit(self._run, job, fn, kwargs)
+        logging.info(f"Queued {kind} job {job_id} for namespace: {namespace}")
+        return job_id
+
+    def _run(self, job: dict, fn, kwargs: dict):
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        self._publish(job)
+        try:
+            result = fn(namespace=job["namespace"], progress=job["progress"], **kwargs)
+            job["status"] = "failed" if result is False else "completed"
+            if result is False:
+                job["error"] = f"{job['kind']} job reported failure."
+        except Exception as e:
+            logging.error(f"Job {job['job_id']} failed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            self._publish(job)
+            logging.info(f"Job {job['job_id']} finished with status: {job['status']}")
+
+    def _trim(self):
+        # Only finished jobs are dropped; queued and running ones stay visible.
+        excess = len(self._jobs) - self._history_limit
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]["finished_at"] is not None:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
+                excess -= 1
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        snapshot = dict(job)
+        snapshot["progress"] = dict(job["progress"])
+        return snapshot
+
+    def _publish(self, job: dict):
+        try:
+            self.tier.set_json(f"job:{job['job_id']}", self._snapshot(job), ttl=JOB_STATUS_TTL)
+        except Exception as e:
+            logging.warning(f"Could not publish status of job {job['job_id']}: {e}")
+
+    async def get(self, job_id: str):
+        """Returns a job snapshot from this process, or from the shared tier if another worker owns it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+        return await self.tier.aget_json(f"job:{job_id}")
+
+    async def get_for_namespace(self, namespace: str):
+        """Returns the snapshot of the latest job submitted for a namespace, if still known."""
+        job_id = await self.tier.aget(f"namespace_job:{namespace}")
+        return await self.get(job_id) if job_id else None
+
+    async def wait(self, job_id: str):
+        """Waits for a job to finish without blocking the event loop and returns its snapshot."""
+        future = self._futures.get(job_id)
+        if future is not None:
+            await asyncio.wrap_future(future)
+        return await self.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -5,29 +5,80 @@ import os
 import json
 import logging
 import asyncio
+import time
 import uuid
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager, suppress
 from typing import List, Optional
 from pydantic import BaseModel, validator
 
 # FastAPI and related imports
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 
 # Add parent directory to path to allow imports from 'scratch'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 # Your application's modules
-from rag.QueryEngine import insert_schema, generate_query_engine, create_namespace_from_tables
-from db.extract_schema import ExtractSchema
+from rag.QueryEngine import (
+    insert_schema,
+    generate_query_engine,
+    stream_query_engine,
+    create_index_namespace,
+    create_namespace_from_tables,
+    index_namespace_of,
+    schema_fingerprint,
+    engine_flights,
+    generation_flights,
+)
+from rag.answer_cache import AnswerCache
+from rag.schema_index import ContextStore
+from rag.sql_validator import SchemaStore, schema_catalog
+from db.extract_schema import ExtractSchema, catalog_cache
+from db.pool import pool_manager
+from db.cost_guard import QueryTooExpensive
+from controller.jobs import JobManager
 from utils.system_prompt import system_prompt
-from models.recommendations import recommendations
-from utils.config import CORS_ALLOWED_ORIGINS, TIMEOUT_SECONDS
+from models.recommendations import RecommendationStore
+from utils.config import (
+    CORS_ALLOWED_ORIGINS,
+    TIMEOUT_SECONDS,
+    DISCONNECT_POLL_INTERVAL,
+    QUERY_STREAM_TIMEOUT_SECONDS,
+    QUERY_ROW_CAP,
+    QUERY_BATCH_MAX_QUESTIONS,
+    QUERY_BATCH_CONCURRENCY,
+    QUERY_STREAM_CHUNK_SIZE,
+    QUERY_MAX_PAGE_SIZE,
+    QUERY_ENGINE_CACHE_SIZE,
+    QUERY_ENGINE_CACHE_TTL,
+)
+from utils.cache import LRUCache
+from utils.cache_tier import get_cache_tier
+from utils.metrics import (
+    REQUEST_DURATION,
+    current_endpoint,
+    request_timings,
+    stage,
+    server_timing_header,
+    render_metrics,
+)
+from utils.continuation import encode_token, decode_token
+from utils.result_format import (
+    RESULT_FORMATS,
+    ARROW_STREAM_MEDIA_TYPE,
+    rows_to_records,
+    rows_to_columnar,
+    rows_to_arrow_ipc,
+    ndjson_line,
+    sse_event,
+)
 
 # Imports for client initialization
 from dotenv import load_dotenv
 from controller.clients import (
-    get_pinecone_index,
+    get_vector_index,
     get_llm,
     get_embed_model_doc,
     get_embed_model_query,
@@ -43,14 +94,26 @@ app_state = {}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("Application starting up...")
-    app_state["pinecone_index"] = get_pinecone_index()
+    app_state["pinecone_index"] = get_vector_index()
     app_state["llm"] = get_llm()
     app_state["embed_model_doc"] = get_embed_model_doc()
     app_state["embed_model_query"] = get_embed_model_query()
-    app_state["query_engine_cache"] = {}
+    app_state["query_engine_cache"] = LRUCache(QUERY_ENGINE_CACHE_SIZE, ttl=QUERY_ENGINE_CACHE_TTL)
+    # Anything other workers must see goes through the shared cache tier.
+    app_state["cache_tier"] = get_cache_tier()
+    app_state["answer_cache"] = AnswerCache(tier=app_state["cache_tier"])
+    app_state["recommendation_store"] = RecommendationStore(tier=app_state["cache_tier"])
+    app_state["schema_store"] = SchemaStore(tier=app_state["cache_tier"])
+    app_state["context_store"] = ContextStore(app_state["pinecone_index"])
+    app_state["background_tasks"] = set()
+    # Shared by all /query_batch requests so concurrent batches cannot multiply LLM load.
+    app_state["batch_semaphore"] = asyncio.Semaphore(QUERY_BATCH_CONCURRENCY)
+    app_state["job_manager"] = JobManager(tier=app_state["cache_tier"])
     logging.info("All clients initialized successfully.")
     yield
     logging.info("Application shutting down...")
+    app_state["job_manager"].shutdown()
+    await pool_manager.close_all()
     app_state.clear()
 
 app = FastAPI(lifespan=lifespan)
@@ -61,6 +124,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Token", "X-Query-Warnings", "Server-Timing"],
 )
 
 # --- Pydantic Models for Request Bodies ---
@@ -88,8 +152,21 @@ class QueryRequest(BaseModel):
     query: str
     namespace_id: str
 
+class QueryBatchRequest(BaseModel):
+    questions: List[str]
+    namespace_id: str
+
+    @validator('questions')
+    def check_questions(cls, v):
+        if not v:
+            raise ValueError("questions must not be empty")
+        if len(v) > QUERY_BATCH_MAX_QUESTIONS:
+            raise ValueError(f"at most {QUERY_BATCH_MAX_QUESTIONS} questions per batch")
+        return v
+
 class RecommendationsRequest(BaseModel):
     namespace_id: str
+    refresh: bool = False
 
 class ExecuteSQLRequest(BaseModel):
     db_type: str
@@ -101,6 +178,16 @@ class ExecuteSQLRequest(BaseModel):
     schema_name: Optional[str] = None
     table_name: str
     query: str
+    stream: bool = False
+    page_size: Optional[int] = None
+    continuation_token: Optional[str] = None
+    format: str = "records"
+
+    @validator('format')
+    def check_format(cls, v):
+        if v not in RESULT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(RESULT_FORMATS)}")
+        return v
 
 class ListTablesRequest(BaseModel):
     db_type: str
@@ -110,6 +197,7 @@ class ListTablesRequest(BaseModel):
     password: str
     database: str
     schema_name: Optional[str] = None
+    refresh: bool = False
 
     @validator('schema_name', pre=True, always=True)
     def set_schema_name(cls, v, values):
@@ -122,16 +210,86 @@ class ListTablesRequest(BaseModel):
 
 # --- API ENDPOINTS ---
 
+def _route_template(request: Request) -> str:
+    # Label metrics by route template, not raw path, to keep label cardinality bounded.
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
 @app.middleware("http")
 async def add_request_id(request: Request, call_next):
     request.state.request_id = str(uuid.uuid4())
-    response = await call_next(request)
-    return response
+    endpoint = _route_template(request)
+    endpoint_token = current_endpoint.set(endpoint)
+    timings_token = request_timings.set([])
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        timings = request_timings.get()
+        if timings:
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+    finally:
+        REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=status)
+        request_timings.reset(timings_token)
+        current_endpoint.reset(endpoint_token)
 
 @app.get("/")
 async def root():
     return {"message": "Text-to-SQL Server is running! 🚀"}
 
+@app.get("/pool_stats")
+async def pool_stats_api():
+    """Reports the state of the shared database connection pools."""
+    return {"success": True, **pool_manager.stats()}
+
+def _metric_gauges():
+    lines = [
+        "# HELP aurasql_db_pool_connections Connections held by each database pool.",
+        "# TYPE aurasql_db_pool_connections gauge",
+    ]
+    for pool in pool_manager.stats()["pools"]:
+        for state in ("active", "idle", "size"):
+            lines.append(
+                f'aurasql_db_pool_connections{{db_type="{pool["db_type"]}",database="{pool["database"]}",state="{state}"}} {pool[state]}'
+            )
+    lines += [
+        "# HELP aurasql_cache_entries Entries held by each in-process cache.",
+        "# TYPE aurasql_cache_entries gauge",
+        f'aurasql_cache_entries{{cache="query_engine"}} {len(app_state["query_engine_cache"])}',
+        f'aurasql_cache_entries{{cache="catalog"}} {len(catalog_cache)}',
+    ]
+    return lines
+
+@app.get("/metrics")
+async def metrics_api():
+    """Exposes per-stage latency histograms and cache counters in Prometheus text format."""
+    return PlainTextResponse(render_metrics(_metric_gauges()), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache_stats")
+async def cache_stats_api():
+    """Reports hit/miss/eviction counters of the in-process caches."""
+    return {
+        "success": True,
+        "query_engine_cache": app_state["query_engine_cache"].stats(),
+        "answer_cache": app_state["answer_cache"].stats(),
+        "recommendations": app_state["recommendation_store"].stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "schema_catalog": app_state["schema_store"].stats(),
+        "context_tables": app_state["context_store"].stats(),
+        "engine_builds": engine_flights.stats(),
+        "generations": generation_flights.stats(),
+        "embeddings": [
+            model.stats()
+            for model in (app_state["embed_model_doc"], app_state["embed_model_query"])
+            if hasattr(model, "stats")
+        ],
+    }
+
 @app.post("/connect")
 async def extract_schema_api(req: ConnectRequest, request: Request):
     """Extracts schema for a single table."""
@@ -159,7 +317,7 @@ async def list_tables_api(req: ListTablesRequest, request: Request):
             schema_name=req.schema_name,
             table_name="", # table_name is not used for listing all tables
         )
-        table_names = await schema_extractor.get_all_table_names()
+        table_names = await schema_extractor.get_all_table_names(refresh=req.refresh)
         logger.info(f"Request {request_id}: Successfully listed {len(table_names)} tables.")
         return {"success": True, "table_names": table_names}
     except Exception as e:
@@ -174,44 +332,104 @@ async def create_multitable_context_api(req: MultiTableContextRequest, request:
     logger.info(f"Request {request_id}: Creating multi-table context.")
     
     try:
-        combined_schema = {}
-        for table_name in req.table_names:
-            schema_extractor = ExtractSchema(
-                db_type=req.db_type, ip=req.ip, port=req.port, username=req.username,
-                password=req.password, database=req.database, schema_name=req.schema_name, table_name=table_name
-            )
-            schema_details = await schema_extractor.extract_schema_details()
-            combined_schema.update(schema_details)
+        schema_extractor = ExtractSchema(
+            db_type=req.db_type, ip=req.ip, port=req.port, username=req.username,
+            password=req.password, database=req.database, schema_name=req.schema_name, table_name=""
+        )
+        combined_schema = await schema_extractor.extract_bulk_schema_details(req.table_names)
 
-        namespace_id = create_namespace_from_tables(req.db_type, req.schema_name, req.table_names)
+        index_namespace = create_index_namespace(req.db_type, req.schema_name, req.ip, req.port, req.database)
+        namespace_id = create_namespace_from_tables(index_namespace, req.table_names)
+        await app_state["schema_store"].put(index_namespace, combined_schema)
 
-        insert_schema(
-            schema_json=combined_schema,
+        # Embedding and upserting run on the indexing pool; clients poll /context_status.
+        job_id = await app_state["job_manager"].submit(
+            "insert_schema",
+            insert_schema,
             namespace=namespace_id,
+            progress={"tables_extracted": len(combined_schema)},
+            schema_json=combined_schema,
             pinecone_index=app_state["pinecone_index"],
             embed_model_doc=app_state["embed_model_doc"],
-            query_engine_cache=app_state["query_engine_cache"]
+            answer_cache=app_state["answer_cache"]
         )
 
-        logger.info(f"Request {request_id}: Multi-table context created with namespace: {namespace_id}")
-        return {"success": True, "namespace_id": namespace_id, "schema": combined_schema}
+        # Recommendations depend only on the schema, so build them once indexing is done.
+        job_manager = app_state["job_manager"]
+        task = asyncio.create_task(app_state["recommendation_store"].precompute(
+            namespace_id,
+            schema_fingerprint(combined_schema),
+            after=job_manager.wait(job_id),
+            tables=list(combined_schema),
+            catalog=schema_catalog(combined_schema),
+            pinecone_index=app_state["pinecone_index"],
+            llm=app_state["llm"],
+            embed_model_query=app_state["embed_model_query"],
+            query_engine_cache=app_state["query_engine_cache"],
+        ))
+        app_state["background_tasks"].add(task)
+        task.add_done_callback(app_state["background_tasks"].discard)
+
+        logger.info(f"Request {request_id}: Multi-table context queued with namespace: {namespace_id}, job: {job_id}")
+        return {"success": True, "namespace_id": namespace_id, "schema": combined_schema, "job_id": job_id}
 
     except Exception as e:
         logger.error(f"Request {request_id}: Failed to create multi-table context: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/context_status/{job_id}")
+async def context_status_api(job_id: str):
+    """Reports status and progress of a background context indexing job."""
+    job = await app_state["job_manager"].get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return {"success": True, **job}
+
+async def _require_indexed(namespace_id: str) -> list:
+    """
+    Refuses queries against a context whose indexing job is still running or has
+    failed, or that was never indexed. Returns the context's tables.
+    """
+    job = await app_state["job_manager"].get_for_namespace(namespace_id)
+    if job is not None and job["status"] != "completed":
+        if job["status"] == "failed":
+            detail = f"Indexing of this context failed: {job.get('error')}. Create the context again."
+        else:
+            detail = f"This context is still being indexed (job {job['job_id']}, {job['status']}). Poll /context_status."
+        raise HTTPException(status_code=409, detail=detail)
+    # Never fall back to the whole database: the context's scope must be known.
+    tables = await app_state["context_store"].get(namespace_id)
+    if tables is None:
+        raise HTTPException(status_code=404, detail=f"Unknown context: {namespace_id}. Create the context again.")
+    return tables
+
+async def _context_catalog(namespace_id: str, tables: list):
+    return await app_state["schema_store"].get(index_namespace_of(namespace_id), tables)
+
 @app.post("/query")
 async def query_api(req: QueryRequest, request: Request):
     """Generates SQL query from a multi-table context."""
     request_id = request.state.request_id
     logger = logging.getLogger(__name__)
     logger.info(f"Request {request_id}: Starting query generation for namespace: {req.namespace_id}")
+    tables = await _require_indexed(req.namespace_id)
 
     try:
-        formatted_query = f"{system_prompt}\nUser Query:\n{req.query}\nDB Type: {req.namespace_id.split('_')[0]}"
+        answer_cache = app_state["answer_cache"]
+        cached_json, query_embedding = await answer_cache.lookup(
+            req.namespace_id, req.query, app_state["embed_model_query"]
+        )
+        if cached_json:
+            logger.info(f"Request {request_id}: Served from answer cache.")
+            return {"success": True, **json.loads(cached_json), "cached": True}
 
         sql_query_json = await generate_query_engine(
-            user_query=formatted_query,
+            user_query=f"{req.query}\nDB Type: {req.namespace_id.split('_')[0]}",
+            instructions=system_prompt,
+            retrieval_query=req.query,
+            retrieval_embedding=query_embedding,
+            tables=tables,
+            catalog=await _context_catalog(req.namespace_id, tables),
             namespace=req.namespace_id,
             pinecone_index=app_state["pinecone_index"],
             llm=app_state["llm"],
@@ -222,34 +440,165 @@ async def query_api(req: QueryRequest, request: Request):
 
         if sql_query_json:
             response_data = json.loads(sql_query_json)
+            await answer_cache.store(req.namespace_id, req.query, sql_query_json, query_embedding)
             logger.info(f"Request {request_id}: Query generation successful.")
             return {"success": True, **response_data}
         else:
             logger.error(f"Request {request_id}: Failed to generate SQL query.")
             raise HTTPException(status_code=500, detail="Failed to generate SQL query.")
 
+    except asyncio.TimeoutError:
+        logger.error(f"Request {request_id}: Timeout in /query")
+        raise HTTPException(status_code=504, detail="Query generation timed out.")
     except Exception as e:
         logger.error(f"Request {request_id}: Error generating SQL query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _stream_query_events(req: QueryRequest, request_id: str, tables: list):
+    logger = logging.getLogger(__name__)
+    answer_cache = app_state["answer_cache"]
+    try:
+        cached_json, query_embedding = await answer_cache.lookup(
+            req.namespace_id, req.query, app_state["embed_model_query"]
+        )
+        if cached_json:
+            logger.info(f"Request {request_id}: Served from answer cache.")
+            yield sse_event("result", {"success": True, **json.loads(cached_json), "cached": True})
+            return
+
+        async for event, payload in stream_query_engine(
+            user_query=f"{req.query}\nDB Type: {req.namespace_id.split('_')[0]}",
+            instructions=system_prompt,
+            retrieval_query=req.query,
+            retrieval_embedding=query_embedding,
+            tables=tables,
+            catalog=await _context_catalog(req.namespace_id, tables),
+            namespace=req.namespace_id,
+            pinecone_index=app_state["pinecone_index"],
+            llm=app_state["llm"],
+            embed_model_query=app_state["embed_model_query"],
+            query_engine_cache=app_state["query_engine_cache"],
+            expected_output_key="sql"
+        ):
+            if event == "result":
+                await answer_cache.store(req.namespace_id, req.query, payload, query_embedding)
+                logger.info(f"Request {request_id}: Streamed query generation successful.")
+                yield sse_event("result", {"success": True, **json.loads(payload)})
+            else:
+                if event == "error":
+                    logger.error(f"Request {request_id}: Streamed query generation failed: {payload['error']}")
+                yield sse_event(event, payload)
+    except Exception as e:
+        logger.error(f"Request {request_id}: Error streaming SQL query: {e}")
+        yield sse_event("error", {"error": str(e)})
+
+@app.post("/query/stream")
+async def query_stream_api(req: QueryRequest, request: Request):
+    """
+    Generates SQL like /query but relays LLM tokens as Server-Sent Events ("token"),
+    then sends "result" with the validated JSON, or "retry"/"error" notices.
+    """
+    request_id = request.state.request_id
+    logging.getLogger(__name__).info(f"Request {request_id}: Streaming query generation for namespace: {req.namespace_id}")
+    tables = await _require_indexed(req.namespace_id)
+    return StreamingResponse(
+        _stream_query_events(req, request_id, tables),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _answer_batch_question(req: QueryBatchRequest, tables: list, index: int, question: str, query_embedding):
+    """Generates SQL for one question of a batch; failures become an error result."""
+    result = {"index": index, "question": question}
+    try:
+        sql_query_json = await generate_query_engine(
+            user_query=f"{question}\nDB Type: {req.namespace_id.split('_')[0]}",
+            instructions=system_prompt,
+            retrieval_query=question,
+            retrieval_embedding=query_embedding,
+            tables=tables,
+            catalog=await _context_catalog(req.namespace_id, tables),
+            namespace=req.namespace_id,
+            pinecone_index=app_state["pinecone_index"],
+            llm=app_state["llm"],
+            embed_model_query=app_state["embed_model_query"],
+            query_engine_cache=app_state["query_engine_cache"],
+            expected_output_key="sql",
+            limiter=app_state["batch_semaphore"]
+        )
+    except asyncio.TimeoutError:
+        return {**result, "success": False, "error": "Query generation timed out."}
+    except Exception as e:
+        return {**result, "success": False, "error": str(e)}
+    if not sql_query_json:
+        return {**result, "success": False, "error": "Failed to generate SQL query."}
+    await app_state["answer_cache"].store(req.namespace_id, question, sql_query_json, query_embedding)
+    return {**result, "success": True, **json.loads(sql_query_json)}
+
+async def _stream_batch_results(req: QueryBatchRequest, request_id: str, tables: list):
+    logger = logging.getLogger(__name__)
+    lookups = await app_state["answer_cache"].lookup_many(
+        req.namespace_id, req.questions, app_state["embed_model_query"]
+    )
+    succeeded = 0
+    tasks = []
+    for index, (question, (cached_json, query_embedding)) in enumerate(zip(req.questions, lookups)):
+        if cached_json:
+            succeeded += 1
+            yield json.dumps({"index": index, "question": question, "success": True,
+                              **json.loads(cached_json), "cached": True}) + "\n"
+        else:
+            tasks.append(asyncio.create_task(_answer_batch_question(req, tables, index, question, query_embedding)))
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            succeeded += result["success"]
+            yield json.dumps(result) + "\n"
+    finally:
+        # For a client that went away this only stops delivering results: generations
+        # already started finish in their shielded flight and keep their batch slot
+        # until then, so a retrying client joins them instead of adding LLM load.
+        for task in tasks:
+            task.cancel()
+    logger.info(f"Request {request_id}: Batch of {len(req.questions)} questions finished, {succeeded} succeeded.")
+    yield json.dumps({"done": True, "total": len(req.questions), "succeeded": succeeded}) + "\n"
+
+@app.post("/query_batch")
+async def query_batch_api(req: QueryBatchRequest, request: Request):
+    """
+    Generates SQL for several questions against one namespace. Answer cache
+    lookups share one batched embedding call, generations run concurrently under
+    QUERY_BATCH_CONCURRENCY, and each result is streamed as an NDJSON line as
+    soon as it is ready, followed by a final {"done": true} line.
+    """
+    request_id = request.state.request_id
+    logging.getLogger(__name__).info(
+        f"Request {request_id}: Batch query generation of {len(req.questions)} questions for namespace: {req.namespace_id}"
+    )
+    tables = await _require_indexed(req.namespace_id)
+    return StreamingResponse(_stream_batch_results(req, request_id, tables), media_type="application/x-ndjson")
+
 @app.post("/recommendations")
 async def recommendations_api(req: RecommendationsRequest, request: Request):
     request_id = request.state.request_id
     logger = logging.getLogger(__name__)
     logger.info(f"Request {request_id}: Starting recommendations generation for namespace: {req.namespace_id}")
+    tables = await _require_indexed(req.namespace_id)
     try:
-        response = await recommendations(
-            namespace=req.namespace_id,
+        response = await app_state["recommendation_store"].get(
+            req.namespace_id,
+            refresh=req.refresh,
+            tables=tables,
+            catalog=await _context_catalog(req.namespace_id, tables),
             pinecone_index=app_state["pinecone_index"],
             llm=app_state["llm"],
             embed_model_query=app_state["embed_model_query"],
             query_engine_cache=app_state["query_engine_cache"],
-            expected_output_key="recommendations"
         )
-        
-        if response:
+
+        if response is not None:
             logger.info(f"Request {request_id}: Recommendations generation successful.")
-            return {"success": True, "recommendations": response.get("recommendations", [])}
+            return {"success": True, "recommendations": response}
         else:
             logger.error(f"Request {request_id}: Failed to generate recommendations.")
             raise HTTPException(status_code=500, detail="Failed to generate recommendations.")
@@ -264,6 +613,95 @@ async def recommendations_api(req: RecommendationsRequest, request: Request):
         logger.error(f"Request {request_id}: Error generating recommendations: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
 
+def _truncation_warning(row_cap: int) -> str:
+    return f"Result was capped at {row_cap} rows; add a LIMIT or narrower filter to see the rest."
+
+async def _stream_sql_results(schema_extractor: ExtractSchema, query: str, request_id: str, warnings=(), capped=False):
+    """
+    Yields NDJSON lines: the column names, one line per chunk of rows, then a summary.
+    The whole stream shares one QUERY_STREAM_TIMEOUT_SECONDS deadline.
+    """
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + QUERY_STREAM_TIMEOUT_SECONDS
+    columns = None
+    row_count = 0
+    warnings = list(warnings)
+    try:
+        async with aclosing(schema_extractor.stream_query(query, chunk_size=QUERY_STREAM_CHUNK_SIZE)) as chunks:
+            while True:
+                # A timed-out fetch is cancelled, which also cancels the statement server-side.
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if columns is None:
+                    columns = chunk
+                    yield ndjson_line({"columns": columns})
+                    continue
+                row_count += len(chunk)
+                yield ndjson_line({"rows": rows_to_records(columns, chunk)})
+        logger.info(f"Request {request_id}: Streamed {row_count} rows.")
+        if capped and row_count >= QUERY_ROW_CAP:
+            warnings.append(_truncation_warning(QUERY_ROW_CAP))
+        summary = {"done": True, "row_count": row_count}
+        if warnings:
+            summary["warnings"] = warnings
+        yield ndjson_line(summary)
+    except asyncio.TimeoutError:
+        logger.error(f"Request {request_id}: SQL streaming timed out after {row_count} rows.")
+        yield ndjson_line({"done": False, "row_count": row_count, "error": "Query execution timed out."})
+    except Exception as e:
+        logger.error(f"Request {request_id}: SQL streaming failed after {row_count} rows: {e}")
+        yield ndjson_line({"done": False, "row_count": row_count, "error": str(e)})
+
+class ClientDisconnected(Exception):
+    pass
+
+async def _cancel_on_disconnect(request: Request, awaitable):
+    """
+    Awaits `awaitable`, cancelling it as soon as the HTTP client goes away, so the
+    database statement behind it is stopped instead of running to completion.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+def _format_sql_result(result_format: str, columns, rows, next_token=None, paged=False, warnings=None):
+    """Encodes driver rows as per-row records, per-column arrays or an Arrow IPC stream."""
+    if result_format == "arrow":
+        headers = {}
+        if next_token:
+            headers["X-Next-Token"] = next_token
+        if warnings:
+            headers["X-Query-Warnings"] = json.dumps(warnings)
+        with stage("serialize"):
+            content = rows_to_arrow_ipc(columns, rows)
+        return Response(content=content, media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers or None)
+
+    response = {"success": True, "columns": columns}
+    with stage("serialize"):
+        if result_format == "columnar":
+            response["format"] = "columnar"
+            response["values"] = rows_to_columnar(columns, rows)
+        else:
+            response["data"] = rows_to_records(columns, rows)
+    if paged:
+        response["next_token"] = next_token
+    if warnings:
+        response["warnings"] = warnings
+    return response
+
 @app.post("/query_sql")
 async def execute_sql_api(req: ExecuteSQLRequest, request: Request):
     request_id = request.state.request_id
@@ -280,17 +718,53 @@ async def execute_sql_api(req: ExecuteSQLRequest, request: Request):
             schema_name=req.schema_name,
             table_name=req.table_name, # This might not be used if query is generic
         )
-        query_response_df = await schema_extractor.execute_query(req.query)
+
+        # Pre-flight: row cap for unbounded SELECTs and, if enabled, an EXPLAIN cost check.
+        query, warnings, capped = await _cancel_on_disconnect(
+            request, asyncio.wait_for(schema_extractor.guard_query(req.query), TIMEOUT_SECONDS)
+        )
+
+        if req.stream:
+            logger.info(f"Request {request_id}: Streaming SQL results as NDJSON.")
+            return StreamingResponse(
+                _stream_sql_results(schema_extractor, query, request_id, warnings, capped),
+                media_type="application/x-ndjson",
+            )
+
+        if req.page_size is not None or req.continuation_token:
+            offset, page_size = 0, req.page_size
+            if req.continuation_token:
+                offset, token_page_size = decode_token(req.continuation_token, req.query)
+                page_size = page_size or token_page_size
+            page_size = max(1, min(page_size or QUERY_MAX_PAGE_SIZE, QUERY_MAX_PAGE_SIZE))
+
+            columns, rows, has_more = await _cancel_on_disconnect(
+                request, asyncio.wait_for(schema_extractor.fetch_page(query, page_size, offset), TIMEOUT_SECONDS)
+            )
+            logger.info(f"Request {request_id}: Fetched page of {len(rows)} rows at offset {offset}.")
+            # Tokens are bound to the submitted SQL, not the capped rewrite of it.
+            next_token = encode_token(req.query, offset + len(rows), page_size) if has_more else None
+            if capped and not has_more and offset + len(rows) >= QUERY_ROW_CAP:
+                warnings.append(_truncation_warning(QUERY_ROW_CAP))
+            return _format_sql_result(req.format, columns, rows, next_token, paged=True, warnings=warnings)
+
+        columns, rows = await _cancel_on_disconnect(
+            request, asyncio.wait_for(schema_extractor.fetch_rows(query), TIMEOUT_SECONDS)
+        )
         logger.info(f"Request {request_id}: SQL execution successful.")
-        return {
-            "success": True,
-            "data": query_response_df.to_dict(orient='records'),
-            "columns": query_response_df.columns.tolist(),
-        }
+        if capped and len(rows) >= QUERY_ROW_CAP:
+            warnings.append(_truncation_warning(QUERY_ROW_CAP))
+        return _format_sql_result(req.format, columns, rows, warnings=warnings)
+    except ClientDisconnected:
+        logger.info(f"Request {request_id}: Client disconnected; cancelled SQL execution.")
+        # Nobody is listening; 499 is what proxies log for client-closed requests.
+        return Response(status_code=499)
     except asyncio.TimeoutError:
         logger.error(f"Request {request_id}: Timeout in /query_sql")
         raise HTTPException(status_code=504, detail="Query execution timed out.")
+    except QueryTooExpensive as e:
+        logger.warning(f"Request {request_id}: Rejected by cost guard: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Request {request_id}: SQL execution failed: {e}")
         raise HTTPException(status_code=400, detail=f"SQL execution failed: {str(e)}")
-
@@ -0,0 +1,73 @@
+import json
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from rag.sql_validator import SQL_DIALECTS
+
+
+class QueryTooExpensive(ValueError):
+    """Raised when the optimizer's estimate for a query exceeds the configured limits."""
+
+
+def read_query(sql: str, db_type: str):
+    """Returns the parsed statement if `sql` is a single plain read query, else None."""
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=SQL_DIALECTS.get(db_type)) if s is not None]
+    except SqlglotError:
+        return None
+    if len(statements) != 1 or not isinstance(statements[0], exp.Query):
+        return None
+    if statements[0].args.get("locks"):
+        return None
+    return statements[0]
+
+
+def add_row_cap(sql: str, db_type: str, row_cap: int):
+    """
+    Appends a dialect-correct row cap to an unbounded read query and returns
+    (sql, capped). The text is appended rather than regenerated so the query
+    the database sees is otherwise exactly what was submitted.
+    """
+    if row_cap <= 0:
+        return sql, False
+    statement = read_query(sql, db_type)
+    if statement is None or statement.args.get("limit") or statement.args.get("fetch"):
+        return sql, False
+    body = sql.rstrip().rstrip(";").rstrip()
+    # On a new line, so a trailing -- comment cannot swallow the cap.
+    if db_type == "oracle":
+        return f"{body}\nFETCH FIRST {row_cap} ROWS ONLY", True
+    return f"{body}\nLIMIT {row_cap}", True
+
+
+def _as_json(value):
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def postgres_plan_estimate(plan_value):
+    """(total cost, rows) of the root node of an EXPLAIN (FORMAT JSON) result."""
+    root = _as_json(plan_value)[0]["Plan"]
+    return float(root["Total Cost"]), float(root["Plan Rows"])
+
+
+def mysql_plan_estimate(plan_value):
+    """(query cost, largest per-join row estimate) of an EXPLAIN FORMAT=JSON result."""
+    plan = _as_json(plan_value)
+    cost = float(plan["query_block"]["cost_info"]["query_cost"])
+    rows = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ("rows_produced_per_join", "rows_examined_per_scan"):
+                    rows.append(float(value))
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(plan)
+    return cost, max(rows) if rows else None
@@ -4,6 +4,51 @@ import oracledb
 import pandas as pd
 import numpy as np
 import logging
+import time
+import asyncio
+import uuid
+from contextlib import aclosing, asynccontextmanager
+from db.pool import pool_manager
+from db.cost_guard import (
+    QueryTooExpensive,
+    read_query,
+    add_row_cap,
+    postgres_plan_estimate,
+    mysql_plan_estimate,
+)
+from utils.cache import LRUCache
+from utils.metrics import stage, record_cache
+from utils.config import (
+    QUERY_STREAM_CHUNK_SIZE,
+    CATALOG_CACHE_TTL,
+    CATALOG_CACHE_SIZE,
+    STATEMENT_TIMEOUT_SECONDS,
+    COST_GUARD_MODE,
+    COST_GUARD_MAX_COST,
+    COST_GUARD_MAX_ROWS,
+    QUERY_ROW_CAP,
+)
+
+# Table listings per (connection identity, schema). Entries are revalidated
+# against a cheap catalog version query once they are older than CATALOG_CACHE_TTL.
+catalog_cache = LRUCache(CATALOG_CACHE_SIZE)
+
+# MySQL: 3024 = MAX_EXECUTION_TIME exceeded, 1969 = MariaDB max_statement_time exceeded.
+MYSQL_TIMEOUT_ERRORS = (3024, 1969)
+# Oracle: DPY-4024 = call timeout exceeded (thin mode), ORA-03156 = same in thick mode.
+ORACLE_TIMEOUT_ERRORS = ("DPY-4024", "ORA-03156")
+# Oracle rejects IN lists of more than 1000 expressions (ORA-01795).
+ORACLE_IN_LIST_LIMIT = 1000
+
+def is_statement_timeout(error) -> bool:
+    """True if a driver error means the server-side statement timeout fired."""
+    if isinstance(error, asyncpg.exceptions.QueryCanceledError):
+        return True
+    if isinstance(error, aiomysql.OperationalError):
+        return bool(error.args) and error.args[0] in MYSQL_TIMEOUT_ERRORS
+    if isinstance(error, oracledb.Error):
+        return getattr(error.args[0], "full_code", None) in ORACLE_TIMEOUT_ERRORS if error.args else False
+    return False
 
 class ExtractSchema:
     def __init__(self, db_type, ip, port, username, password, database, schema_name, table_name):
@@ -16,66 +61,204 @@ class ExtractSchema:
         self.schema_name = schema_name
         self.table_name = table_name
 
-    async def connect_to_database(self):
+    def acquire_connection(self):
+        """Borrows a connection from the shared pool for this database."""
+        return pool_manager.acquire(
+            self.db_type, self.ip, self.port, self.username, self.password, self.database_schema
+        )
+
+    @asynccontextmanager
+    async def guard_statement(self, conn):
+        """
+        Cancels the running statement server-side when the caller is cancelled
+        (client disconnect or deadline), and surfaces server-side statement
+        timeouts as asyncio.TimeoutError.
+        """
+        try:
+            yield
+        except asyncio.CancelledError:
+            await pool_manager.cancel_statement(
+                self.db_type, conn, self.ip, self.port, self.username, self.password, self.database_schema
+            )
+            raise
+        except Exception as e:
+            if is_statement_timeout(e):
+                raise asyncio.TimeoutError(f"Statement exceeded the {STATEMENT_TIMEOUT_SECONDS}s limit.") from e
+            raise
+
+    @staticmethod
+    @asynccontextmanager
+    async def mysql_cursor(conn, cursor_class=aiomysql.Cursor):
+        """
+        conn.cursor() for MySQL, except that closing is skipped once a cancelled
+        statement has closed the connection; there is nothing left to drain then.
+        """
+        cursor = await conn.cursor(cursor_class)
         try:
+            yield cursor
+        finally:
+            if not conn.closed:
+                await cursor.close()
+
+    async def execute_query(self, query, params=None):
+        columns, results = await self.fetch_rows(query, params)
+        with stage("dataframe", self.db_type):
+            df = pd.DataFrame(results, columns=columns)
+        return df
+
+    async def fetch_rows(self, query, params=None):
+        """Returns (columns, rows) straight from the driver, without building a DataFrame."""
+        async with self.acquire_connection() as conn:
+            with stage("db_execute", self.db_type):
+                # The guard sits inside the cursor block so a cancelled statement is
+                # stopped before the cursor tries to read the rest of its result.
+                if self.db_type == "postgresql":
+                    async with self.guard_statement(conn):
+                        statement = await conn.prepare(query)
+                        columns = [attr.name for attr in statement.get_attributes()]
+                        results = await statement.fetch(*(params or ()))
+                elif self.db_type == "mysql":
+                    async with self.mysql_cursor(conn) as cursor, self.guard_statement(conn):
+                        await cursor.execute(query, params or ())
+                        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                        results = await cursor.fetchall()
+                elif self.db_type == "oracle":
+                    async with conn.cursor() as cursor, self.guard_statement(conn):
+                        await cursor.execute(query, params or ())
+                        columns = [desc[0] for desc in cursor.description]
+                        results = await cursor.fetchall()
+                else:
+                    raise ValueError(f"Unsupported database type: {self.db_type}")
+
+        return columns, results
+
+    async def stream_query(self, query, params=None, chunk_size=QUERY_STREAM_CHUNK_SIZE, offset=0):
+        """
+        Runs a query on a server-side cursor. The first item yielded is the list
+        of column names, every following item is a list of at most chunk_size rows.
+        """
+        async with self.acquire_connection() as conn:
             if self.db_type == "postgresql":
-                return await asyncpg.connect(
-                    host=self.ip,
-                    port=self.port,
-                    user=self.username,
-                    password=self.password,
-                    database=self.database_schema,
-                    ssl='require'
-                )
+                # asyncpg cursors only live inside a transaction.
+                async with conn.transaction(), self.guard_statement(conn):
+                    statement = await conn.prepare(query)
+                    yield [attr.name for attr in statement.get_attributes()]
+                    cursor = await statement.cursor(*(params or ()), prefetch=chunk_size)
+                    if offset:
+                        await cursor.forward(offset)
+                    while True:
+                        rows = await cursor.fetch(chunk_size)
+                        if not rows:
+                            break
+                        yield rows
             elif self.db_type == "mysql":
-                return await aiomysql.connect(
-                    host=self.ip,
-                    port=self.port,
-                    user=self.username,
-                    password=self.password,
-                    db=self.database_schema
-                )
+                async with self.mysql_cursor(conn, aiomysql.SSCursor) as cursor, self.guard_statement(conn):
+                    await cursor.execute(query, params or ())
+                    yield [desc[0] for desc in cursor.description] if cursor.description else []
+                    if offset:
+                        await cursor.scroll(offset, mode='relative')
+                    while True:
+                        rows = await cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield rows
             elif self.db_type == "oracle":
-                dsn = f"{self.username}/{self.password}@{self.ip}:{self.port}/{self.database_schema}"
-                return await oracledb.connect_async(dsn=dsn)
+                async with conn.cursor() as cursor, self.guard_statement(conn):
+                    cursor.arraysize = chunk_size
+                    cursor.prefetchrows = chunk_size + 1
+                    await cursor.execute(query, params or ())
+                    yield [desc[0] for desc in cursor.description]
+                    skipped = 0
+                    while skipped < offset:
+                        rows = await cursor.fetchmany(min(chunk_size, offset - skipped))
+                        if not rows:
+                            break
+                        skipped += len(rows)
+                    while True:
+                        rows = await cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield rows
             else:
                 raise ValueError(f"Unsupported database type: {self.db_type}")
-        except (OSError, asyncpg.exceptions.PostgresError) as e:
-            # Catching OSError for nodename nor servname provided, or not known
-            # and other potential DNS/network-related errors.
-            # Catching asyncpg.exceptions.PostgresError for more specific postgres errors.
-            logging.error(f"Database connection failed for {self.db_type} at {self.ip}:{self.port}. Error: {e}")
-            raise ValueError(f"Database connection failed: {e}") from e
 
-    async def execute_query(self, query, params=None):
-        conn = await self.connect_to_database()
-        try:
+    async def fetch_page(self, query, page_size, offset=0, params=None):
+        """
+        Returns (columns, rows, has_more) for one page of a query, reading only
+        as far as the page end through a server-side cursor.
+        """
+        columns, rows = None, []
+        async with aclosing(self.stream_query(query, params, chunk_size=page_size + 1, offset=offset)) as chunks:
+            async for chunk in chunks:
+                if columns is None:
+                    columns = chunk
+                    continue
+                rows.extend(chunk)
+                if len(rows) > page_size:
+                    break
+        return columns or [], rows[:page_size], len(rows) > page_size
+
+    async def explain_query(self, query):
+        """
+        Asks the optimizer for its estimate without running the query.
+        Returns (estimated cost, estimated rows); either may be None.
+        """
+        with stage("explain", self.db_type):
             if self.db_type == "postgresql":
-                statement = await conn.prepare(query)
-                columns = [attr.name for attr in statement.get_attributes()]
-                results = await statement.fetch(*(params or ()))
+                _, rows = await self.fetch_rows(f"EXPLAIN (FORMAT JSON) {query}")
+                return postgres_plan_estimate(rows[0][0])
             elif self.db_type == "mysql":
-                async with conn.cursor() as cursor:
-                    await cursor.execute(query, params or ())
-                    columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                    results = await cursor.fetchall()
+                _, rows = await self.fetch_rows(f"EXPLAIN FORMAT=JSON {query}")
+                return mysql_plan_estimate(rows[0][0])
             elif self.db_type == "oracle":
-                async with conn.cursor() as cursor:
-                    await cursor.execute(query, params or ())
-                    columns = [desc[0] for desc in cursor.description]
-                    results = await cursor.fetchall()
+                # EXPLAIN PLAN writes into PLAN_TABLE, so all three statements must share a session.
+                statement_id = uuid.uuid4().hex[:30]
+                query = query.rstrip().rstrip(";")
+                async with self.acquire_connection() as conn:
+                    async with conn.cursor() as cursor, self.guard_statement(conn):
+                        await cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {query}")
+                        await cursor.execute(
+                            "SELECT cost, cardinality FROM plan_table WHERE statement_id = :1 AND id = 0",
+                            (statement_id,),
+                        )
+                        row = await cursor.fetchone()
+                        await cursor.execute("DELETE FROM plan_table WHERE statement_id = :1", (statement_id,))
+                if row is None:
+                    return None, None
+                return tuple(None if value is None else float(value) for value in row)
             else:
                 raise ValueError(f"Unsupported database type: {self.db_type}")
-                        
-            
-            df = pd.DataFrame(results, columns=columns)
-            return df
-        finally:
-            if conn:
-                if self.db_type in ["postgresql", "oracle"]:
-                    await conn.close()
-                elif self.db_type == "mysql":
-                    conn.close()
+
+    async def guard_query(self, query, mode=COST_GUARD_MODE, row_cap=QUERY_ROW_CAP):
+        """
+        Pre-flight for user-supplied SQL. Appends a row cap to unbounded SELECTs and,
+        unless `mode` is "off", checks the optimizer estimate against the cost and
+        row limits. Returns (query to run, warnings, whether a cap was added);
+        raises QueryTooExpensive in "reject" mode.
+        """
+        warnings = []
+        if mode != "off" and read_query(query, self.db_type) is not None:
+            try:
+                cost, rows = await self.explain_query(query)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                logging.warning(f"Could not estimate cost of query on {self.db_type}: {e}")
+                cost, rows = None, None
+            problems = []
+            if cost is not None and cost > COST_GUARD_MAX_COST:
+                problems.append(f"estimated cost {cost:,.0f} exceeds {COST_GUARD_MAX_COST:,.0f}")
+            if rows is not None and rows > COST_GUARD_MAX_ROWS:
+                problems.append(f"estimated rows {rows:,.0f} exceed {COST_GUARD_MAX_ROWS:,.0f}")
+            if problems:
+                message = "Query plan is too expensive: " + "; ".join(problems) + "."
+                if mode == "reject":
+                    raise QueryTooExpensive(message)
+                logging.warning(message)
+                warnings.append(message)
+
+        query, capped = add_row_cap(query, self.db_type, row_cap)
+        return query, warnings, capped
 
     async def extract_schema_details(self):
         query, params = self.get_schema_query()
@@ -141,7 +324,164 @@ class ExtractSchema:
         
         return query, params
 
-    async def get_all_table_names(self):
+    async def extract_bulk_schema_details(self, table_names):
+        """
+        Extracts column metadata for many tables with a single catalog query, or
+        one per ORACLE_IN_LIST_LIMIT tables on Oracle.
+        """
+        if not table_names:
+            return {}
+        table_names = list(table_names)
+        batch_size = ORACLE_IN_LIST_LIMIT if self.db_type == 'oracle' else len(table_names)
+        frames = []
+        for start in range(0, len(table_names), batch_size):
+            query, params = self.get_bulk_schema_query(table_names[start:start + batch_size])
+            frames.append(await self.execute_query(query, params))
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+        df.replace({np.nan: None, np.inf: None, -np.inf: None}, inplace=True)
+
+        # Oracle stores unquoted identifiers in upper case, so match on that.
+        if self.db_type == 'oracle':
+            lookup = {name.upper(): name for name in table_names}
+        else:
+            lookup = {name: name for name in table_names}
+
+        combined_schema = {name: [] for name in table_names}
+        table_column = df.columns[0]
+        for record in df.to_dict(orient='records'):
+            table_name = lookup.get(record.pop(table_column))
+            if table_name is not None:
+                combined_schema[table_name].append(record)
+        return combined_schema
+
+    def get_bulk_schema_query(self, table_names):
+        """Same catalog queries as get_schema_query, filtered on a list of tables."""
+        if self.db_type == 'postgresql':
+            query = """ SELECT 
+                        c.table_name,
+                        c.column_name, 
+                        c.data_type, 
+                        c.is_nullable, 
+                        c.character_maximum_length, 
+                        c.numeric_precision, 
+                        c.numeric_scale, 
+                        tc.constraint_type, 
+                        c.column_default
+                    FROM 
+                        information_schema.columns c
+                    LEFT JOIN 
+                        information_schema.key_column_usage kcu
+                        ON c.table_name = kcu.table_name 
+                        AND c.column_name = kcu.column_name 
+                        AND c.table_schema = kcu.table_schema
+                    LEFT JOIN 
+                        information_schema.table_constraints tc
+                        ON tc.constraint_name = kcu.constraint_name 
+                        AND tc.table_schema = kcu.table_schema
+                    WHERE 
+                        c.table_name = ANY($1::text[])
+                        AND c.table_schema = $2
+                    ORDER BY 
+                        c.table_name,
+                        c.ordinal_position;"""
+            params = (list(table_names), self.schema_name)
+        elif self.db_type == 'mysql':
+            placeholders = ", ".join(["%s"] * len(table_names))
+            query = f"""SELECT 
+                TABLE_NAME,
+                COLUMN_NAME, 
+                COLUMN_TYPE, 
+                IS_NULLABLE, 
+                COLUMN_DEFAULT, 
+                EXTRA 
+            FROM 
+                information_schema.columns 
+            WHERE 
+                table_name IN ({placeholders}) AND table_schema = %s
+            ORDER BY 
+                TABLE_NAME, ORDINAL_POSITION;"""
+            params = (*table_names, self.database_schema)
+        elif self.db_type == 'oracle':
+            placeholders = ", ".join(f":{i}" for i in range(1, len(table_names) + 1))
+            query = f"""SELECT 
+                table_name,
+                column_name, 
+                data_type, 
+                nullable, 
+                data_default 
+            FROM 
+                all_tab_columns 
+            WHERE 
+                table_name IN ({placeholders}) AND owner = :{len(table_names) + 1}
+            ORDER BY 
+                table_name, column_id"""
+            params = (*(name.upper() for name in table_names), self.database_schema.upper())
+        else:
+            raise ValueError(f"Unsupported database type: {self.db_type}")
+
+        return query, params
+
+    def _catalog_key(self):
+        identity = pool_manager.make_key(
+            self.db_type, self.ip, self.port, self.username, self.password, self.database_schema
+        )
+        return (*identity, self.schema_name)
+
+    async def get_catalog_version(self):
+        """
+        Returns a cheap fingerprint of the table catalog that changes when tables
+        are created, dropped or renamed, or None if it cannot be determined.
+        """
+        if self.db_type == 'postgresql':
+            query = """SELECT count(*), md5(string_agg(c.relname, ',' ORDER BY c.relname))
+                FROM pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = $1 AND c.relkind IN ('r', 'p', 'v', 'f');"""
+            params = (self.schema_name,)
+        elif self.db_type == 'mysql':
+            query = """SELECT COUNT(*), MAX(CREATE_TIME), MAX(UPDATE_TIME), SUM(CRC32(TABLE_NAME))
+                FROM information_schema.tables
+                WHERE table_schema = %s;"""
+            params = (self.database_schema,)
+        elif self.db_type == 'oracle':
+            query = """SELECT COUNT(*), MAX(last_ddl_time)
+                FROM all_objects
+                WHERE owner = :1 AND object_type = 'TABLE'"""
+            params = (self.database_schema.upper(),)
+        else:
+            raise ValueError(f"Unsupported database type: {self.db_type}")
+
+        try:
+            _, rows = await self.fetch_rows(query, params)
+        except Exception as e:
+            logging.warning(f"Could not read catalog version for {self.db_type} at {self.ip}:{self.port}: {e}")
+            return None
+        return "|".join(str(value) for value in rows[0]) if rows else None
+
+    async def get_all_table_names(self, refresh=False):
+        """
+        Lists table names, served from the catalog cache while it is fresh or while
+        the catalog version is unchanged. `refresh` forces a new listing.
+        """
+        key = self._catalog_key()
+        entry = None if refresh else catalog_cache.get(key)
+        record_cache("catalog", entry is not None)
+        if entry is not None:
+            if time.monotonic() - entry["checked_at"] < CATALOG_CACHE_TTL:
+                return list(entry["tables"])
+            version = await self.get_catalog_version()
+            if version is not None and version == entry["version"]:
+                entry["checked_at"] = time.monotonic()
+                return list(entry["tables"])
+        else:
+            version = await self.get_catalog_version()
+
+        tables = await self.fetch_all_table_names()
+        catalog_cache.put(key, {"tables": tables, "version": version, "checked_at": time.monotonic()})
+        return list(tables)
+
+    async def fetch_all_table_names(self):
         if self.db_type == 'postgresql':
             query = "SELECT table_name FROM information_schema.tables WHERE table_schema = $1 AND table_catalog = $2;"
             params = (self.schema_name, self.database_schema)
@@ -164,4 +504,4 @@ class ExtractSchema:
             return df['table_name'].tolist()
 
         else:
-            raise ValueError(f"Unsupported database type: {self.db_type}")
\ No newline at end of file
+            raise ValueError(f"Unsupported database type: {self.db_type}")
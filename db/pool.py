@@ -0,0 +1,324 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+import aiomysql
+import oracledb
+
+from utils.metrics import record_stage
+from utils.config import (
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    STATEMENT_TIMEOUT_SECONDS,
+    CANCEL_TIMEOUT_SECONDS,
+)
+
+
+def mysql_timeout_command(version: str, timeout_ms: int):
+    """
+    The session statement timeout for a MySQL-protocol server's VERSION(), or None
+    if it has none. MariaDB 10.1+ has max_statement_time (seconds); MySQL 5.7.8+
+    has MAX_EXECUTION_TIME (milliseconds, SELECT only).
+    """
+    mariadb = re.search(r"(\d+)\.(\d+)\.(\d+)-MariaDB", version, re.IGNORECASE)
+    if mariadb:
+        if tuple(map(int, mariadb.groups())) >= (10, 1, 0):
+            return f"SET SESSION max_statement_time={timeout_ms / 1000:g}"
+        return None
+    mysql = re.match(r"(\d+)\.(\d+)\.(\d+)", version)
+    if mysql and tuple(map(int, mysql.groups())) >= (5, 7, 8):
+        return f"SET SESSION MAX_EXECUTION_TIME={timeout_ms}"
+    return None
+
+
+class _PoolEntry:
+    def __init__(self, key, pool):
+        self.key = key
+        self.pool = pool
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_health_check = self.created_at
+        self.acquisitions = 0
+        self.active = 0
+
+
+class PoolManager:
+    """
+    Process-wide registry of database connection pools, one per
+    (db_type, host, port, user, database) target.
+    """
+
+    def __init__(
+        self,
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+        idle_timeout: int = DB_POOL_IDLE_TIMEOUT,
+        health_check_interval: int = DB_POOL_HEALTH_CHECK_INTERVAL,
+        statement_timeout: int = STATEMENT_TIMEOUT_SECONDS,
+        cancel_timeout: float = CANCEL_TIMEOUT_SECONDS,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.statement_timeout_ms = int(statement_timeout * 1000)
+        self.cancel_timeout = cancel_timeout
+        self._pools = {}
+        # One lock per pool key, so a slow or unreachable host only blocks
+        # callers of that same target while its pool is being created.
+        self._key_locks = {}
+        self.created = 0
+        self.evicted = 0
+        self.health_check_failures = 0
+
+    @staticmethod
+    def make_key(db_type, host, port, user, password, database):
+        # The password digest keeps a caller with different credentials from
+        # borrowing connections that were authenticated by someone else.
+        password_digest = hashlib.sha256((password or "").encode()).hexdigest()[:16]
+        return (db_type, host, int(port), user, database, password_digest)
+
+    async def _mysql_init_command(self, host, port, user, password, database):
+        conn = await aiomysql.connect(
+            host=host, port=port, user=user, password=password, db=database,
+            connect_timeout=self.cancel_timeout,
+        )
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT VERSION()")
+                (version,) = await cursor.fetchone()
+        finally:
+            conn.close()
+        command = mysql_timeout_command(version, self.statement_timeout_ms)
+        if command is None:
+            # Deadlines and KILL QUERY on cancellation still bound these servers.
+            logging.warning(f"MySQL server {host}:{port} ({version}) has no session statement timeout.")
+        return command
+
+    async def _create_pool(self, db_type, host, port, user, password, database):
+        try:
+            if db_type == "postgresql":
+                return await asyncpg.create_pool(
+                    host=host,
+                    port=port,
+                    user=user,
+                    password=password,
+                    database=database,
+                    ssl='require',
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    max_inactive_connection_lifetime=self.idle_timeout,
+                    server_settings={"statement_timeout": str(self.statement_timeout_ms)},
+                )
+            elif db_type == "mysql":
+                return await aiomysql.create_pool(
+                    host=host,
+                    port=port,
+                    user=user,
+                    password=password,
+                    db=database,
+                    minsize=self.min_size,
+                    maxsize=self.max_size,
+                    pool_recycle=self.idle_timeout,
+                    # Nothing is committed; acquire() rolls back on release instead.
+                    autocommit=False,
+                    # The setting differs between MySQL and MariaDB, and older servers
+                    # reject both, which would fail every pooled connection.
+                    init_command=await self._mysql_init_command(host, port, user, password, database),
+                )
+            elif db_type == "oracle":
+                return oracledb.create_pool_async(
+                    user=user,
+                    password=password,
+                    dsn=f"{host}:{port}/{database}",
+                    min=self.min_size,
+                    max=self.max_size,
+                    increment=1,
+                    timeout=self.idle_timeout,
+                )
+            else:
+                raise ValueError(f"Unsupported database type: {db_type}")
+        except (OSError, asyncpg.exceptions.PostgresError) as e:
+            logging.error(f"Database pool creation failed for {db_type} at {host}:{port}. Error: {e}")
+            raise ValueError(f"Database connection failed: {e}") from e
+
+    @staticmethod
+    async def _close_pool(db_type, pool):
+        try:
+            if db_type == "mysql":
+                pool.close()
+                await pool.wait_closed()
+            else:
+                await pool.close()
+        except Exception as e:
+            logging.warning(f"Error while closing {db_type} pool: {e}")
+
+    @staticmethod
+    async def _ping(db_type, conn):
+        if db_type == "postgresql":
+            await conn.execute("SELECT 1")
+        elif db_type == "mysql":
+            await conn.ping(reconnect=True)
+        elif db_type == "oracle":
+            await conn.ping()
+
+    async def _evict_idle(self):
+        now = time.monotonic()
+        idle = [
+            (key, entry) for key, entry in self._pools.items()
+            if entry.active == 0 and now - entry.last_used > self.idle_timeout
+        ]
+        # Entries leave the registry before any await, so no caller can pick them up.
+        for key, _ in idle:
+            del self._pools[key]
+            lock = self._key_locks.get(key)
+            if lock is not None and not lock.locked():
+                del self._key_locks[key]
+        for key, entry in idle:
+            self.evicted += 1
+            logging.info(f"Evicting idle {key[0]} pool for {key[1]}:{key[2]}/{key[4]}")
+            await self._close_pool(key[0], entry.pool)
+
+    async def _get_entry(self, db_type, host, port, user, password, database):
+        key = self.make_key(db_type, host, port, user, password, database)
+        await self._evict_idle()
+        entry = self._pools.get(key)
+        if entry is not None:
+            return entry
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._pools.get(key)
+            if entry is None:
+                logging.info(f"Creating {db_type} connection pool for {host}:{port}/{database}")
+                pool = await self._create_pool(db_type, host, port, user, password, database)
+                entry = _PoolEntry(key, pool)
+                self._pools[key] = entry
+                self.created += 1
+        return entry
+
+    async def _health_check(self, entry):
+        """Pings one pooled connection and rebuilds the pool if it is unusable."""
+        db_type, host, port, user, database, _ = entry.key
+        entry.last_health_check = time.monotonic()
+        try:
+            async with entry.pool.acquire() as conn:
+                await self._ping(db_type, conn)
+            return entry
+        except Exception as e:
+            self.health_check_failures += 1
+            logging.warning(f"Health check failed for {db_type} pool at {host}:{port}/{database}: {e}. Recreating pool.")
+            if self._pools.get(entry.key) is entry:
+                del self._pools[entry.key]
+            await self._close_pool(db_type, entry.pool)
+            return None
+
+    @asynccontextmanager
+    async def acquire(self, db_type, host, port, user, password, database):
+        """Yields a pooled connection, creating the pool on first use."""
+        start = time.perf_counter()
+        entry = await self._get_entry(db_type, host, port, user, password, database)
+        if time.monotonic() - entry.last_health_check > self.health_check_interval:
+            if await self._health_check(entry) is None:
+                entry = await self._get_entry(db_type, host, port, user, password, database)
+
+        entry.active += 1
+        entry.acquisitions += 1
+        try:
+            async with entry.pool.acquire() as conn:
+                record_stage("db_acquire", time.perf_counter() - start, db_type)
+                if db_type == "oracle":
+                    conn.call_timeout = self.statement_timeout_ms
+                try:
+                    yield conn
+                finally:
+                    if db_type == "mysql" and not conn.closed:
+                        await self._rollback_mysql(conn)
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+
+    @staticmethod
+    async def _rollback_mysql(conn):
+        # Discards changes from any statement that got past the guard, and ends
+        # the REPEATABLE READ snapshot so it does not outlive the request.
+        try:
+            await conn.rollback()
+        except Exception as e:
+            logging.warning(f"Rollback failed on a pooled MySQL connection, closing it: {e}")
+            conn.close()
+
+    async def cancel_statement(self, db_type, conn, host, port, user, password, database):
+        """
+        Stops the statement running on `conn` server-side. asyncpg already cancels
+        the running query when its task is cancelled, so only MySQL and Oracle
+        need help here.
+        """
+        try:
+            if db_type == "mysql":
+                # KILL QUERY has to come from a second session. The killed connection
+                # is closed so the pool drops it instead of handing out one with
+                # unread results.
+                thread_id = conn.thread_id()
+                side = await aiomysql.connect(
+                    host=host, port=port, user=user, password=password, db=database,
+                    connect_timeout=self.cancel_timeout,
+                )
+                try:
+                    async with side.cursor() as cursor:
+                        await asyncio.wait_for(cursor.execute("KILL QUERY %s", (thread_id,)), self.cancel_timeout)
+                finally:
+                    side.close()
+                conn.close()
+            elif db_type == "oracle":
+                conn.cancel()
+        except Exception as e:
+            logging.warning(f"Could not cancel running {db_type} statement on {host}:{port}/{database}: {e}")
+
+    @staticmethod
+    def _pool_size(db_type, pool):
+        if db_type == "postgresql":
+            return pool.get_size(), pool.get_idle_size()
+        elif db_type == "mysql":
+            return pool.size, pool.freesize
+        elif db_type == "oracle":
+            return pool.opened, pool.opened - pool.busy
+        return 0, 0
+
+    def stats(self):
+        now = time.monotonic()
+        pools = []
+        for (db_type, _, _, _, database, _), entry in self._pools.items():
+            size, idle = self._pool_size(db_type, entry.pool)
+            # Host and user names stay out of this unauthenticated report.
+            pools.append({
+                "db_type": db_type,
+                "database": database,
+                "size": size,
+                "idle": idle,
+                "active": entry.active,
+                "acquisitions": entry.acquisitions,
+                "age_seconds": round(now - entry.created_at, 1),
+                "idle_seconds": round(now - entry.last_used, 1),
+            })
+        return {
+            "pools": pools,
+            "pools_created": self.created,
+            "pools_evicted": self.evicted,
+            "health_check_failures": self.health_check_failures,
+        }
+
+    async def close_all(self):
+        entries = list(self._pools.values())
+        self._pools.clear()
+        self._key_locks.clear()
+        for entry in entries:
+            await self._close_pool(entry.key[0], entry.pool)
+
+
+pool_manager = PoolManager()
@@ -15,6 +15,7 @@ import {
   executeQuery, 
   extractSchema, 
   createMultiTableContext, 
+  waitForContext, 
   listTables, 
   logGeneratedQuery, 
   logExecutedQuery 
@@ -202,6 +203,14 @@ export default function QueryInterface() {
       });
 
       if (result.success && result.namespace_id && result.schema) {
+        if (result.job_id) {
+          setLoadingMessage("Indexing table schemas...");
+          const status = await waitForContext(result.job_id);
+          if (status.status === 'failed') {
+            setError(`Indexing failed: ${status.error || "unknown error"}`);
+            return;
+          }
+        }
         setNamespaceId(result.namespace_id);
         setExtractedSchemas(result.schema);
         setSelectedSchemaTable(selectedTables[0]?.value || null); // Set first table as default
@@ -32,9 +32,18 @@ interface ApiResponse<T = any> {
   explanation?: string
   source_tables?: string[]
   namespace_id?: string
+  job_id?: string
   columns?: string[]
 }
 
+interface ContextStatus {
+  success: boolean
+  job_id: string
+  status: 'queued' | 'running' | 'completed' | 'failed'
+  error?: string | null
+  progress?: Record<string, number>
+}
+
 // Replace with your actual backend URL
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
  
@@ -87,6 +96,27 @@ export async function createMultiTableContext(config: MultiTableContextConfig):
   }
 }
 
+export async function getContextStatus(jobId: string): Promise<ContextStatus> {
+  const response = await fetch(`${API_BASE_URL}/context_status/${encodeURIComponent(jobId)}`)
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+
+  return await response.json()
+}
+
+// Context indexing runs in the background; queries are refused until it completes.
+export async function waitForContext(jobId: string, intervalMs = 1000): Promise<ContextStatus> {
+  while (true) {
+    const status = await getContextStatus(jobId)
+    if (status.status === 'completed' || status.status === 'failed') {
+      return status
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs))
+  }
+}
+
 export async function listTables(config: DbConfig): Promise<ApiResponse<{ table_names: string[] }>> {
   try {
     const response = await fetch(`${API_BASE_URL}/list_tables`, {
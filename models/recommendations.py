@@ -1,6 +1,11 @@
 import json
 from rag.QueryEngine import generate_query_engine
-from utils.prompt_recommendations import prompt
+from utils.cache import LRUCache
+from utils.cache_tier import CacheTier, MemoryCacheTier
+from utils.config import RECOMMENDATIONS_TTL
+from utils.single_flight import SingleFlight
+from utils.metrics import record_cache
+from utils.prompt_recommendations import prompt, retrieval_query
 import logging
 import asyncio
 
@@ -10,21 +15,27 @@ async def recommendations(
     pinecone_index,
     llm,
     embed_model_query,
-    query_engine_cache: dict,
-    expected_output_key: str # Added this parameter
+    query_engine_cache: LRUCache,
+    expected_output_key: str, # Added this parameter
+    tables: list,
+    catalog: dict = None
 ):
     """
     Generates recommendations by asynchronously calling the query engine.
+    Retrieval is restricted to the context's `tables`; `catalog` validates the SQL.
     """
     try:
         recommendations_json = await generate_query_engine(
             user_query=prompt,
+            retrieval_query=retrieval_query,
             namespace=namespace,
             pinecone_index=pinecone_index,
             llm=llm,
             embed_model_query=embed_model_query,
             query_engine_cache=query_engine_cache,
-            expected_output_key=expected_output_key # Pass it along
+            expected_output_key=expected_output_key, # Pass it along
+            tables=tables,
+            catalog=catalog
         )
         
         if recommendations_json is None:
@@ -34,4 +45,78 @@ async def recommendations(
 
     except Exception as e:
         logging.error(f"An unexpected error occurred in recommendations: {e}")
-        raise
\ No newline at end of file
+        raise
+
+class RecommendationStore:
+    """
+    Recommendations keyed by (namespace, schema fingerprint). They are generated
+    once per schema version, normally in the background right after indexing,
+    and served from the shared cache tier afterwards, so every worker sees them.
+    """
+
+    def __init__(self, tier: CacheTier = None, ttl: float = RECOMMENDATIONS_TTL):
+        self.tier = tier or MemoryCacheTier()
+        self.ttl = ttl
+        self._flights = SingleFlight("recommendations")
+        self.hits = 0
+        self.misses = 0
+
+    async def set_fingerprint(self, namespace: str, fingerprint: str):
+        await self.tier.aset(f"fingerprint:{namespace}", fingerprint, ttl=self.ttl)
+
+    async def _key(self, namespace: str):
+        return (namespace, await self.tier.aget(f"fingerprint:{namespace}"))
+
+    @staticmethod
+    def _tier_key(key) -> str:
+        namespace, fingerprint = key
+        return f"recommendations:{namespace}:{fingerprint}"
+
+    async def _generate(self, key, **generate_kwargs):
+        namespace, fingerprint = key
+        logging.info(f"Generating recommendations for namespace {namespace} (schema {fingerprint})")
+        response = await recommendations(
+            namespace=namespace,
+            expected_output_key="recommendations",
+            **generate_kwargs
+        )
+        result = response.get("recommendations", [])
+        await self.tier.aset_json(self._tier_key(key), result, ttl=self.ttl)
+        return result
+
+    async def get(self, namespace: str, *, refresh: bool = False, **generate_kwargs) -> list:
+        """Returns stored recommendations, generating them if missing or if refresh is set."""
+        key = await self._key(namespace)
+        if refresh:
+            await self.tier.adelete(self._tier_key(key))
+        else:
+            cached = await self.tier.aget_json(self._tier_key(key))
+            if cached is not None:
+                self.hits += 1
+                record_cache("recommendations", True)
+                return cached
+        self.misses += 1
+        record_cache("recommendations", False)
+        return await self._flights.do(key, self._generate, key, **generate_kwargs)
+
+    async def precompute(self, namespace: str, fingerprint: str, *, after=None, **generate_kwargs):
+        """
+        Generates recommendations for a new schema version in the background.
+        `after` is an optional awaitable (e.g. the indexing job) to finish first.
+        """
+        key = (namespace, fingerprint)
+        try:
+            if after is not None:
+                job = await after
+                if job and job.get("status") != "completed":
+                    logging.warning(f"Skipping recommendations for {namespace}: indexing {job.get('status')}.")
+                    return
+            await self.set_fingerprint(namespace, fingerprint)
+            if await self.tier.aget(self._tier_key(key)) is not None:
+                return
+            await self._flights.do(key, self._generate, key, **generate_kwargs)
+        except Exception as e:
+            logging.error(f"Background recommendations failed for namespace {namespace}: {e}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, **self._flights.stats()}
@@ -1,18 +1,34 @@
 import os
 import json
+import asyncio
 import hashlib
+import time
 import sqlparse
 from dotenv import load_dotenv
-from llama_index.core import (
-    VectorStoreIndex,
-    Settings,
-    StorageContext,
-    Document
-)
-from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core import get_response_synthesizer
+from llama_index.core.schema import MetadataMode, QueryBundle
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.vector_stores.pinecone import PineconeVectorStore
 from utils.clean_format import clean_json
+from rag.sql_validator import validate_sql
+from rag.schema_index import (
+    SchemaRetriever,
+    build_table_nodes,
+    column_vector_id,
+    existing_table_vectors,
+    index_namespace_of,
+    write_context_record,
+)
+from utils.cache import LRUCache
+from utils.single_flight import SingleFlight
+from rag.answer_cache import normalize_question
+from utils.config import (
+    EMBED_BATCH_SIZE,
+    LLM_TIMEOUT_SECONDS,
+    EMBEDDING_TIMEOUT_SECONDS,
+    VECTOR_QUERY_TIMEOUT_SECONDS,
+)
+from utils.metrics import stage, record_stage, record_cache, current_endpoint, GENERATION_ATTEMPTS
 import logging
 import traceback
 
@@ -22,12 +38,28 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 # Load environment variables once, although they should be loaded by main.py
 load_dotenv()
 
-def create_namespace_from_tables(db_type: str, schema_name: str, table_names: list[str]) -> str:
-    """Creates a unique, deterministic namespace ID from a list of table names."""
+engine_flights = SingleFlight("query engine build")
+generation_flights = SingleFlight("LLM generation")
+
+def create_index_namespace(db_type: str, schema_name: str, host: str, port: int, database: str) -> str:
+    """Vector namespace holding the tables of one database schema, shared by all its contexts."""
+    hasher = hashlib.sha256(f"{host}:{port}/{database}".encode())
+    return f"{db_type}_{schema_name}__{hasher.hexdigest()[:16]}"
+
+def create_namespace_from_tables(index_namespace: str, table_names: list[str]) -> str:
+    """Creates a unique, deterministic context ID for a set of tables of one database."""
     sorted_tables = "_".join(sorted(table_names))
     # Use a hash to keep the namespace short and manageable
     hasher = hashlib.sha256(sorted_tables.encode())
-    return f"{db_type}_{schema_name}__{hasher.hexdigest()[:16]}"
+    return f"{index_namespace}_{hasher.hexdigest()[:16]}"
+
+def schema_fingerprint(schema_json: dict) -> str:
+    """Content hash of a whole combined schema, used to key derived artifacts."""
+    return hashlib.sha256(json.dumps(schema_json, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+def _delete_vectors(pinecone_index, namespace: str, ids: list):
+    for start in range(0, len(ids), 1000):
+        pinecone_index.delete(ids=ids[start:start + 1000], namespace=namespace)
 
 def insert_schema(
     schema_json: dict,
@@ -35,43 +67,97 @@ def insert_schema(
     *,
     pinecone_index,
     embed_model_doc,
-    query_engine_cache: dict
+    answer_cache=None,
+    progress: dict = None
 ):
     """
-    Inserts a combined schema for multiple tables into a specific Pinecone namespace.
+    Indexes the tables of a context into its database's shared namespace. Each
+    table's vectors carry a content hash, so tables already indexed by any
+    context over the same database are not re-embedded; only new or changed
+    tables are. Tables outside `schema_json` are left alone, since other
+    contexts may use them. The context's table list is written last, as its
+    context record, so a context is only queryable once fully indexed.
+    If a progress dict is given, node and vector counters are updated in it as work proceeds.
     """
+    if progress is None:
+        progress = {}
+    db_type = namespace.split("_")[0]
+    index_namespace = index_namespace_of(namespace)
     try:
-        logging.info(f"Starting schema insertion process for namespace: {namespace}")
+        logging.info(f"Starting schema insertion for context {namespace} into namespace: {index_namespace}")
+        if not schema_json:
+            raise ValueError(f"Context {namespace} has no tables to index.")
+
+        table_nodes = {
+            table_name: build_table_nodes(table_name, schema)
+            for table_name, schema in schema_json.items()
+        }
+        with stage("index_diff", db_type):
+            existing = existing_table_vectors(pinecone_index, index_namespace, table_nodes)
 
-        stats = pinecone_index.describe_index_stats()
-        if len(stats["namespaces"]) >= 100:
-            logging.warning("Namespace limit is close to 100.")
+        nodes_to_upsert = []
+        stale_ids = []
+        unchanged = 0
+        for table_name, (schema_hash, nodes) in table_nodes.items():
+            current = existing.get(table_name)
+            if current and current["schema_hash"] == schema_hash:
+                unchanged += 1
+                continue
+            nodes_to_upsert.extend(nodes)
+            if current:
+                # Upserting overwrites groups by ID; only groups past the new count go stale.
+                column_groups = len(nodes) - 1
+                stale_ids.extend(column_vector_id(table_name, i) for i in range(column_groups, current["column_groups"]))
 
-        if namespace in stats["namespaces"]:
-            logging.info(f"Clearing vectors in existing namespace: {namespace}")
-            pinecone_index.delete(delete_all=True, namespace=namespace)
+        logging.info(
+            f"Namespace {index_namespace}: {unchanged} tables already indexed, "
+            f"{len(table_nodes) - unchanged} to upsert ({len(nodes_to_upsert)} nodes)."
+        )
 
-        Settings.embed_model = embed_model_doc
-        logging.info("Document embeddings model set.")
+        progress.update(
+            tables_unchanged=unchanged,
+            nodes_total=len(nodes_to_upsert),
+            nodes_embedded=0,
+            vectors_upserted=0,
+            vectors_deleted=0,
+        )
 
-        # Create one document per table to improve retrieval accuracy
-        documents = [
-            Document(text=f"Table `{table_name}`: {json.dumps(schema)}")
-            for table_name, schema in schema_json.items()
-        ]
+        if nodes_to_upsert:
+            vector_store = PineconeVectorStore(pinecone_index=pinecone_index, namespace=index_namespace)
+            # Embed and upsert in batches so progress is visible while a large context is built.
+            for start in range(0, len(nodes_to_upsert), EMBED_BATCH_SIZE):
+                batch = nodes_to_upsert[start:start + EMBED_BATCH_SIZE]
+                with stage("embedding", db_type):
+                    embeddings = embed_model_doc.get_text_embedding_batch(
+                        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+                    )
+                for node, embedding in zip(batch, embeddings):
+                    node.embedding = embedding
+                progress["nodes_embedded"] += len(batch)
 
-        text_splitter = SentenceSplitter(chunk_size=1536, chunk_overlap=100)
-        nodes = text_splitter.get_nodes_from_documents(documents)
+                with stage("upsert", db_type):
+                    vector_store.add(batch)
+                progress["vectors_upserted"] += len(batch)
 
-        vector_store = PineconeVectorStore(pinecone_index=pinecone_index, namespace=namespace)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        VectorStoreIndex(nodes=nodes, storage_context=storage_context)
-        
-        if namespace in query_engine_cache:
-            del query_engine_cache[namespace]
-            logging.info(f"Removed outdated query engine from cache for namespace: {namespace}")
+        # Delete after upserting so a changed table is never missing from the namespace.
+        if stale_ids:
+            with stage("delete", db_type):
+                _delete_vectors(pinecone_index, index_namespace, stale_ids)
+            progress["vectors_deleted"] = len(stale_ids)
 
-        logging.info(f"Schema added to Pinecone successfully under namespace: {namespace}")
+        if nodes_to_upsert:
+            dimension = len(nodes_to_upsert[0].embedding)
+        else:
+            dimension = next(iter(existing.values()))["dimension"]
+        write_context_record(pinecone_index, namespace, table_nodes, dimension)
+
+        # Cached engines need no invalidation: a context ID fixes its table list and
+        # retrieval reads the shared vectors live. Cached answers of every context
+        # over this database may use a changed table, so all of them are dropped.
+        if (nodes_to_upsert or stale_ids) and answer_cache is not None and answer_cache.invalidate(index_namespace):
+            logging.info(f"Removed cached answers for namespace: {index_namespace}")
+
+        logging.info(f"Schema for context {namespace} indexed under namespace: {index_namespace}")
         return True
 
     except Exception as e:
@@ -79,6 +165,51 @@ def insert_schema(
         traceback.print_exc()
         return False
 
+def _build_query_engine(namespace: str, *, pinecone_index, llm, tables):
+    # The LLM is bound to this engine explicitly; nothing is read from or written to
+    # the global llama_index Settings. Retrieval needs no embedding model: callers
+    # always supply the question's embedding.
+    retriever = SchemaRetriever(pinecone_index, index_namespace_of(namespace), tables)
+    return RetrieverQueryEngine.from_args(
+        retriever=retriever,
+        llm=llm
+    )
+
+async def get_query_engine(
+    namespace: str,
+    *,
+    pinecone_index,
+    llm,
+    query_engine_cache: LRUCache,
+    tables: list
+):
+    """
+    Returns the cached query engine for a context, building it off the event loop
+    if needed. Concurrent builds for the same context are coalesced into one.
+    Retrieval is restricted to `tables`, the context's table list.
+    """
+    query_engine = query_engine_cache.get(namespace)
+    record_cache("query_engine", query_engine is not None)
+    if query_engine is not None:
+        logging.info(f"Using cached query engine for namespace: {namespace}")
+        return query_engine
+
+    async def build():
+        logging.info(f"Creating new query engine for namespace: {namespace}")
+        with stage("engine_build", namespace.split("_")[0]):
+            engine = await asyncio.to_thread(
+                _build_query_engine,
+                namespace,
+                pinecone_index=pinecone_index,
+                llm=llm,
+                tables=tables,
+            )
+        query_engine_cache.put(namespace, engine)
+        logging.info(f"New query engine created and cached for namespace: {namespace}")
+        return engine
+
+    return await engine_flights.do(namespace, build)
+
 async def generate_query_engine(
     user_query: str,
     namespace: str,
@@ -86,71 +217,286 @@ async def generate_query_engine(
     pinecone_index,
     llm,
     embed_model_query,
-    query_engine_cache: dict,
+    query_engine_cache: LRUCache,
     expected_output_key: str, # New parameter
-    max_retries: int = 2
+    tables: list,
+    instructions: str = None,
+    retrieval_query: str = None,
+    retrieval_embedding: list = None,
+    catalog: dict = None,
+    max_retries: int = 2,
+    limiter: asyncio.Semaphore = None
 ):
     """
     Generates a query response using a cached or new query engine from a specific namespace.
+    Retrieval embeds only `retrieval_query` (default: `user_query`), or reuses
+    `retrieval_embedding` if given; `instructions` are sent to the LLM alone.
+    Retrieval is limited to the context's `tables`; when `catalog` ({table: [columns]})
+    is given, generated SQL is checked against it.
+    Identical concurrent requests for a namespace share one generation.
+    A `limiter` slot is held for as long as the generation runs, even if the
+    caller is cancelled first.
     """
-    if namespace in query_engine_cache:
-        logging.info(f"Using cached query engine for namespace: {namespace}")
-        query_engine = query_engine_cache[namespace]
-    else:
-        logging.info(f"Creating new query engine for namespace: {namespace}")
-        Settings.llm = llm
-        Settings.embed_model = embed_model_query
-
-        vector_store = PineconeVectorStore(pinecone_index=pinecone_index, namespace=namespace)
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-        retriever = index.as_retriever(similarity_top_k=5)
-        
-        query_engine = RetrieverQueryEngine.from_args(
-            retriever=retriever,
-            llm=Settings.llm
+    llm_query = f"{instructions}\nUser Query:\n{user_query}" if instructions else user_query
+    retrieval_query = retrieval_query or user_query
+
+    prompt_digest = hashlib.sha256(
+        f"{normalize_question(llm_query)}\x1f{normalize_question(retrieval_query)}".encode()
+    ).hexdigest()
+    return await generation_flights.do(
+        (namespace, expected_output_key, prompt_digest),
+        _limited_generate,
+        limiter,
+        llm_query,
+        retrieval_query,
+        namespace,
+        pinecone_index=pinecone_index,
+        llm=llm,
+        embed_model_query=embed_model_query,
+        query_engine_cache=query_engine_cache,
+        expected_output_key=expected_output_key,
+        tables=tables,
+        retrieval_embedding=retrieval_embedding,
+        catalog=catalog,
+        max_retries=max_retries,
+    )
+
+async def _limited_generate(limiter, *args, **kwargs):
+    # Runs inside the shielded flight, so the slot is only released when the work ends.
+    if limiter is None:
+        return await _generate(*args, **kwargs)
+    async with limiter:
+        return await _generate(*args, **kwargs)
+
+def _validate_response(response_text: str, expected_output_key: str, catalog: dict, db_type: str) -> str:
+    """
+    Checks one LLM answer and returns the cleaned JSON string. Raises ValueError or
+    JSONDecodeError with a message meant to be fed back to the LLM on retry.
+    """
+    cleaned_response_str = clean_json(response_text)
+    response_json = json.loads(cleaned_response_str)
+
+    # Check for the expected key
+    if expected_output_key not in response_json:
+        raise ValueError(f"LLM response did not contain '{expected_output_key}' key.")
+
+    # Only perform SQL validation if expected_output_key is 'sql'
+    if expected_output_key == 'sql':
+        sql_query = response_json.get("sql")
+        if sql_query is None:
+            raise ValueError("LLM response 'sql' value was null.")
+        parsed = sqlparse.parse(sql_query)
+        if not parsed or parsed[0].get_type() == 'UNKNOWN':
+            raise ValueError("Generated SQL has invalid syntax.")
+        if catalog:
+            errors = validate_sql(sql_query, catalog, db_type)
+            if errors:
+                raise ValueError("Generated SQL does not match the schema: " + " ".join(errors))
+    return cleaned_response_str.strip()
+
+def _retry_prompt(llm_query: str, error: Exception, expected_output_key: str) -> str:
+    return (
+        f"{llm_query}\n\nPrevious attempt failed. Please fix the following error: {error}. "
+        f"Regenerate the JSON, ensuring the format is correct and contains the '{expected_output_key}' key."
+    )
+
+async def _generate(
+    llm_query: str,
+    retrieval_query: str,
+    namespace: str,
+    *,
+    pinecone_index,
+    llm,
+    embed_model_query,
+    query_engine_cache: LRUCache,
+    expected_output_key: str,
+    tables: list,
+    retrieval_embedding: list,
+    catalog: dict,
+    max_retries: int
+):
+    db_type = namespace.split("_")[0]
+    try:
+        query_engine = await get_query_engine(
+            namespace,
+            pinecone_index=pinecone_index,
+            llm=llm,
+            query_engine_cache=query_engine_cache,
+            tables=tables,
         )
-        query_engine_cache[namespace] = query_engine
-        logging.info(f"New query engine created and cached for namespace: {namespace}")
+        # Embedding, retrieval and synthesis run as separate steps so each can be
+        # timed; retries reuse the retrieved nodes since the question is unchanged.
+        if retrieval_embedding is None:
+            with stage("embedding", db_type):
+                retrieval_embedding = await asyncio.wait_for(
+                    embed_model_query.aget_query_embedding(retrieval_query), EMBEDDING_TIMEOUT_SECONDS
+                )
+    except asyncio.TimeoutError:
+        logging.error(f"Embedding the question for namespace {namespace} timed out.")
+        raise
+    except Exception as e:
+        logging.error(f"Failed to prepare retrieval for namespace {namespace}: {e}")
+        traceback.print_exc()
+        return None
 
+    nodes = None
     for attempt in range(max_retries):
         try:
             logging.info(f"Executing query attempt {attempt + 1}...")
-            response = await query_engine.aquery(user_query)
+            # The retriever uses the precomputed embedding of the question only;
+            # the synthesizer sees the full prompt in query_str.
+            query_bundle = QueryBundle(
+                query_str=llm_query,
+                custom_embedding_strs=[retrieval_query],
+                embedding=retrieval_embedding,
+            )
+            if nodes is None:
+                with stage("retrieval", db_type):
+                    nodes = await asyncio.wait_for(query_engine.aretrieve(query_bundle), VECTOR_QUERY_TIMEOUT_SECONDS)
+            with stage("synthesis", db_type):
+                response = await asyncio.wait_for(query_engine.asynthesize(query_bundle, nodes), LLM_TIMEOUT_SECONDS)
             logging.info("Query executed successfully for namespace " + namespace + "having db_type " + namespace.split("_")[0])
-            
-            cleaned_response_str = clean_json(response.response)
-            # logging.info(f"Raw LLM response (cleaned): {cleaned_response_str}") # Added logging
-            
-            response_json = json.loads(cleaned_response_str)
-            
-            # Check for the expected key
-            if expected_output_key not in response_json:
-                raise ValueError(f"LLM response did not contain '{expected_output_key}' key.")
-
-            # Only perform SQL validation if expected_output_key is 'sql'
-            if expected_output_key == 'sql':
-                sql_query = response_json.get("sql")
-                if sql_query is None:
-                    raise ValueError("LLM response 'sql' value was null.")
-                parsed = sqlparse.parse(sql_query)
-                if not parsed or parsed[0].get_type() == 'UNKNOWN':
-                    raise ValueError("Generated SQL has invalid syntax.")
+
+            with stage("validation", db_type):
+                cleaned_response_str = _validate_response(response.response, expected_output_key, catalog, db_type)
 
             logging.info("Query generated and validated successfully.")
-            return cleaned_response_str.strip()
+            GENERATION_ATTEMPTS.observe(
+                attempt + 1, endpoint=current_endpoint.get(), output=expected_output_key, outcome="success"
+            )
+            return cleaned_response_str
 
         except (json.JSONDecodeError, ValueError, KeyError) as e:
             logging.warning(f"Attempt {attempt + 1} failed: {e}. Retrying...")
-            user_query = (
-                f"{user_query}\n\nPrevious attempt failed. Please fix the following error: {e}. "
-                f"Regenerate the JSON, ensuring the format is correct and contains the '{expected_output_key}' key."
-            )
+            llm_query = _retry_prompt(llm_query, e, expected_output_key)
             if attempt + 1 == max_retries:
                 logging.error("Max retries reached. Failed to generate valid response.")
+                GENERATION_ATTEMPTS.observe(
+                    attempt + 1, endpoint=current_endpoint.get(), output=expected_output_key, outcome="failed"
+                )
                 return None
+        except asyncio.TimeoutError:
+            # Deadlines are not retried: the caller's own time budget is already spent.
+            logging.error(f"Attempt {attempt + 1} timed out for namespace {namespace}.")
+            GENERATION_ATTEMPTS.observe(
+                attempt + 1, endpoint=current_endpoint.get(), output=expected_output_key, outcome="timeout"
+            )
+            raise
         except Exception as e:
             logging.error(f"An unexpected error occurred in generate_query_engine: {e}")
             traceback.print_exc()
             return None
 
     return None
+
+async def stream_query_engine(
+    user_query: str,
+    namespace: str,
+    *,
+    pinecone_index,
+    llm,
+    embed_model_query,
+    query_engine_cache: LRUCache,
+    expected_output_key: str,
+    tables: list,
+    instructions: str = None,
+    retrieval_query: str = None,
+    retrieval_embedding: list = None,
+    catalog: dict = None,
+    max_retries: int = 2
+):
+    """
+    Streaming counterpart of generate_query_engine. Yields (event, payload) pairs:
+    "token" for each LLM delta, "retry" when an attempt fails validation, then a
+    final "result" with the validated JSON string or "error".
+    Streams are not coalesced, since every caller needs its own tokens.
+    """
+    llm_query = f"{instructions}\nUser Query:\n{user_query}" if instructions else user_query
+    retrieval_query = retrieval_query or user_query
+    db_type = namespace.split("_")[0]
+    try:
+        query_engine = await get_query_engine(
+            namespace,
+            pinecone_index=pinecone_index,
+            llm=llm,
+            query_engine_cache=query_engine_cache,
+            tables=tables,
+        )
+        if retrieval_embedding is None:
+            with stage("embedding", db_type):
+                retrieval_embedding = await asyncio.wait_for(
+                    embed_model_query.aget_query_embedding(retrieval_query), EMBEDDING_TIMEOUT_SECONDS
+                )
+        query_bundle = QueryBundle(
+            query_str=llm_query,
+            custom_embedding_strs=[retrieval_query],
+            embedding=retrieval_embedding,
+        )
+        with stage("retrieval", db_type):
+            nodes = await asyncio.wait_for(query_engine.aretrieve(query_bundle), VECTOR_QUERY_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logging.error(f"Retrieval for namespace {namespace} timed out.")
+        yield "error", {"error": "Retrieving schema context timed out."}
+        return
+    except Exception as e:
+        logging.error(f"Failed to prepare retrieval for namespace {namespace}: {e}")
+        traceback.print_exc()
+        yield "error", {"error": "Failed to retrieve schema context."}
+        return
+
+    synthesizer = get_response_synthesizer(llm=llm, streaming=True)
+    for attempt in range(max_retries):
+        try:
+            start = time.perf_counter()
+            deadline = time.monotonic() + LLM_TIMEOUT_SECONDS
+            first_token = True
+            tokens = []
+            response = await asyncio.wait_for(synthesizer.asynthesize(
+                QueryBundle(query_str=llm_query, custom_embedding_strs=[retrieval_query], embedding=retrieval_embedding),
+                nodes,
+            ), LLM_TIMEOUT_SECONDS)
+            token_stream = response.async_response_gen()
+            while True:
+                # The deadline covers the whole completion, not each token.
+                try:
+                    token = await asyncio.wait_for(token_stream.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                if first_token:
+                    record_stage("first_token", time.perf_counter() - start, db_type)
+                    first_token = False
+                tokens.append(token)
+                yield "token", {"attempt": attempt + 1, "text": token}
+            record_stage("synthesis", time.perf_counter() - start, db_type)
+
+            with stage("validation", db_type):
+                cleaned_response_str = _validate_response("".join(tokens), expected_output_key, catalog, db_type)
+
+            GENERATION_ATTEMPTS.observe(
+                attempt + 1, endpoint=current_endpoint.get(), output=expected_output_key, outcome="success"
+            )
+            yield "result", cleaned_response_str
+            return
+
+        except (json.JSONDecodeError, ValueError, KeyError) as e:
+            logging.warning(f"Streamed attempt {attempt + 1} failed: {e}.")
+            llm_query = _retry_prompt(llm_query, e, expected_output_key)
+            if attempt + 1 == max_retries:
+                GENERATION_ATTEMPTS.observe(
+                    attempt + 1, endpoint=current_endpoint.get(), output=expected_output_key, outcome="failed"
+                )
+                yield "error", {"error": f"Failed to generate a valid response: {e}"}
+                return
+            yield "retry", {"attempt": attempt + 1, "error": str(e)}
+        except asyncio.TimeoutError:
+            logging.error(f"Streamed attempt {attempt + 1} timed out for namespace {namespace}.")
+            GENERATION_ATTEMPTS.observe(
+                attempt + 1, endpoint=current_endpoint.get(), output=expected_output_key, outcome="timeout"
+            )
+            yield "error", {"error": f"The LLM did not finish within {LLM_TIMEOUT_SECONDS:g}s."}
+            return
+        except Exception as e:
+            logging.error(f"An unexpected error occurred in stream_query_engine: {e}")
+            traceback.print_exc()
+            yield "error", {"error": str(e)}
+            return
@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.config import (
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_MAX_NAMESPACES,
+    ANSWER_CACHE_TTL,
+    EMBEDDING_TIMEOUT_SECONDS,
+)
+from utils.cache_tier import CacheTier, MemoryCacheTier
+from utils.metrics import record_cache
+from rag.embedding_cache import aembed_queries
+from rag.schema_index import index_namespace_of
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?.!; ")
+
+
+class _NamespaceAnswers:
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.exact = OrderedDict()  # normalized question -> response JSON string
+        self.questions = []
+        self.embeddings = []
+        self.matrix = None
+
+    def add(self, normalized: str, response: str, embedding, max_entries: int):
+        self.exact[normalized] = response
+        self.exact.move_to_end(normalized)
+        if embedding is not None and normalized not in self.questions:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                self.questions.append(normalized)
+                self.embeddings.append(vector / norm)
+                self.matrix = None
+        while len(self.exact) > max_entries:
+            evicted, _ = self.exact.popitem(last=False)
+            if evicted in self.questions:
+                i = self.questions.index(evicted)
+                del self.questions[i]
+                del self.embeddings[i]
+                self.matrix = None
+
+    def nearest(self, embedding):
+        if not self.embeddings:
+            return None, 0.0
+        if self.matrix is None:
+            self.matrix = np.vstack(self.embeddings)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None, 0.0
+        scores = self.matrix @ (vector / norm)
+        best = int(np.argmax(scores))
+        return self.questions[best], float(scores[best])
+
+
+class AnswerCache:
+    """
+    Per-namespace cache of validated {sql, explanation, source_tables} responses.
+    Looks up exact matches on the normalized question first, then falls back to
+    cosine similarity of question embeddings above a threshold.
+
+    Exact answers live in the shared cache tier so every worker can serve them;
+    the embedding index for similarity lookups is kept per process. A generation
+    counter per database namespace in the tier invalidates both everywhere, for
+    every context over that database, since contexts share its tables.
+    """
+
+    def __init__(
+        self,
+        tier: CacheTier = None,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_namespaces: int = ANSWER_CACHE_MAX_NAMESPACES,
+        ttl: float = ANSWER_CACHE_TTL,
+    ):
+        self.tier = tier or MemoryCacheTier()
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+        self.ttl = ttl
+        self._namespaces = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def _generation(self, namespace: str) -> int:
+        return int(await self.tier.aget(f"answer-gen:{index_namespace_of(namespace)}") or 0)
+
+    @staticmethod
+    def _answer_key(namespace: str, generation: int, normalized: str) -> str:
+        return f"answer:{namespace}:{generation}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def _local(self, namespace: str, generation: int, create: bool = False):
+        """Returns this process's answers for a namespace, dropping them if another worker invalidated it."""
+        answers = self._namespaces.get(namespace)
+        if answers is not None and answers.generation != generation:
+            del self._namespaces[namespace]
+            answers = None
+        if answers is None and create:
+            answers = self._namespaces[namespace] = _NamespaceAnswers(generation)
+        if answers is not None:
+            self._namespaces.move_to_end(namespace)
+            while len(self._namespaces) > self.max_namespaces:
+                self._namespaces.popitem(last=False)
+        return answers
+
+    async def get_exact(self, namespace: str, question: str):
+        normalized = normalize_question(question)
+        generation = await self._generation(namespace)
+        with self._lock:
+            answers = self._local(namespace, generation)
+            response = answers.exact.get(normalized) if answers else None
+        if response is None:
+            response = await self.tier.aget(self._answer_key(namespace, generation, normalized))
+        if response is not None:
+            with self._lock:
+                self.exact_hits += 1
+        return response
+
+    async def get_similar(self, namespace: str, embedding):
+        generation = await self._generation(namespace)
+        with self._lock:
+            answers = self._local(namespace, generation)
+            if answers is not None:
+                question, score = answers.nearest(embedding)
+                if question is not None and score >= self.similarity_threshold:
+                    self.semantic_hits += 1
+                    logging.info(f"Semantic answer cache hit in {namespace} (similarity {score:.3f})")
+                    return answers.exact[question]
+            self.misses += 1
+            return None
+
+    async def lookup(self, namespace: str, question: str, embed_model):
+        """
+        Returns (cached response or None, question embedding or None). The embedding
+        is handed back so a later store() does not need to compute it again.
+        """
+        response = await self.get_exact(namespace, question)
+        if response is not None:
+            record_cache("answer", True)
+            return response, None
+        try:
+            # Embed the raw question so the vector can be reused for retrieval.
+            embedding = await asyncio.wait_for(embed_model.aget_query_embedding(question), EMBEDDING_TIMEOUT_SECONDS)
+        except Exception as e:
+            logging.warning(f"Answer cache could not embed question for {namespace}: {e}")
+            with self._lock:
+                self.misses += 1
+            record_cache("answer", False)
+            return None, None
+        response = await self.get_similar(namespace, embedding)
+        record_cache("answer", response is not None)
+        return response, embedding
+
+    async def lookup_many(self, namespace: str, questions, embed_model):
+        """
+        Batch form of lookup(): exact hits first, then one embedding call for all
+        remaining questions. Returns a list of (cached response or None, embedding or None).
+        """
+        results = [(await self.get_exact(namespace, question), None) for question in questions]
+        pending = [i for i, (response, _) in enumerate(results) if response is None]
+        record_cache("answer", True, len(questions) - len(pending))
+        if not pending:
+            return results
+        try:
+            embeddings = await asyncio.wait_for(
+                aembed_queries(embed_model, [questions[i] for i in pending]), EMBEDDING_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            logging.warning(f"Answer cache could not embed {len(pending)} questions for {namespace}: {e}")
+            with self._lock:
+                self.misses += len(pending)
+            record_cache("answer", False, len(pending))
+            return results
+        for i, embedding in zip(pending, embeddings):
+            response = await self.get_similar(namespace, embedding)
+            record_cache("answer", response is not None)
+            results[i] = (response, embedding)
+        return results
+
+    async def store(self, namespace: str, question: str, response: str, embedding=None):
+        normalized = normalize_question(question)
+        generation = await self._generation(namespace)
+        await self.tier.aset(self._answer_key(namespace, generation, normalized), response, ttl=self.ttl)
+        with self._lock:
+            answers = self._local(namespace, generation, create=True)
+            answers.add(normalized, response, embedding, self.max_entries)
+
+    def invalidate(self, index_namespace: str) -> bool:
+        """Drops the answers of every context over the database namespace `index_namespace`."""
+        # Bumping the generation orphans every worker's entries for those contexts;
+        # old keys in the tier simply expire.
+        self.tier.incr(f"answer-gen:{index_namespace}")
+        with self._lock:
+            for namespace in [ns for ns in self._namespaces if index_namespace_of(ns) == index_namespace]:
+                del self._namespaces[namespace]
+            self.invalidations += 1
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "namespaces": len(self._namespaces),
+                "entries": sum(len(answers.exact) for answers in self._namespaces.values()),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import PrivateAttr
+
+from utils.metrics import record_cache
+
+
+class EmbeddingStore:
+    """
+    Content-addressed SQLite store of embedding vectors. Keys are hashes of
+    (model name, input type, kind, text); vectors are stored as float32 blobs.
+    """
+
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_name: str, input_type: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\x1f{input_type}\x1f{kind}\x1f{text}".encode()).hexdigest()
+
+    def get_many(self, keys: List[str]) -> dict:
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), self._LOOKUP_BATCH):
+                batch = unique[start:start + self._LOOKUP_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+    # SQLite blocks on disk I/O, so callers on the event loop use these.
+
+    async def aget_many(self, keys: List[str]) -> dict:
+        return await asyncio.to_thread(self.get_many, keys)
+
+    async def aput_many(self, items: dict):
+        if items:
+            await asyncio.to_thread(self.put_many, items)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps another llama_index embedding model and serves repeated texts from an
+    EmbeddingStore. Batches are looked up at once and only the misses are sent
+    to the provider, in a single batched call.
+    """
+
+    _inner: Any = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+    _input_type: str = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, inner: BaseEmbedding, store: EmbeddingStore, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._store = store
+        self._input_type = str(getattr(inner, "input_type", "") or "")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _keys(self, kind: str, texts: List[str]) -> List[str]:
+        return [self._store.make_key(self.model_name, self._input_type, kind, text) for text in texts]
+
+    def _missing(self, keys: List[str], found: dict) -> List[int]:
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        self._hits += len(keys) - len(missing)
+        self._misses += len(missing)
+        record_cache("embedding", True, len(keys) - len(missing))
+        record_cache("embedding", False, len(missing))
+        return missing
+
+    def _lookup(self, kind: str, texts: List[str]):
+        keys = self._keys(kind, texts)
+        found = self._store.get_many(keys)
+        return keys, found, self._missing(keys, found)
+
+    async def _alookup(self, kind: str, texts: List[str]):
+        keys = self._keys(kind, texts)
+        found = await self._store.aget_many(keys)
+        return keys, found, self._missing(keys, found)
+
+    def _merge(self, keys, found, missing, computed) -> List[Embedding]:
+        new_items = {keys[i]: vector for i, vector in zip(missing, computed)}
+        self._store.put_many(new_items)
+        found.update(new_items)
+        return [found[key] for key in keys]
+
+    async def _amerge(self, keys, found, missing, computed) -> List[Embedding]:
+        new_items = {keys[i]: vector for i, vector in zip(missing, computed)}
+        await self._store.aput_many(new_items)
+        found.update(new_items)
+        return [found[key] for key in keys]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = self._lookup("text", texts)
+        computed = self._inner.get_text_embedding_batch([texts[i] for i in missing]) if missing else []
+        return self._merge(keys, found, missing, computed)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = await self._alookup("text", texts)
+        computed = await self._inner.aget_text_embedding_batch([texts[i] for i in missing]) if missing else []
+        return await self._amerge(keys, found, missing, computed)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        keys, found, missing = self._lookup("query", [query])
+        computed = [self._inner.get_query_embedding(query)] if missing else []
+        return self._merge(keys, found, missing, computed)[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        keys, found, missing = await self._alookup("query", [query])
+        computed = [await self._inner.aget_query_embedding(query)] if missing else []
+        return (await self._amerge(keys, found, missing, computed))[0]
+
+    async def aget_query_embedding_batch(self, queries: List[str]) -> List[Embedding]:
+        """Query embeddings for many questions; only the misses go to the provider, in one call."""
+        keys, found, missing = await self._alookup("query", queries)
+        computed = await self._inner.aget_text_embedding_batch([queries[i] for i in missing]) if missing else []
+        return await self._amerge(keys, found, missing, computed)
+
+    def stats(self) -> dict:
+        return {"model_name": self.model_name, "input_type": self._input_type, "hits": self._hits, "misses": self._misses}
+
+
+async def aembed_queries(embed_model: BaseEmbedding, queries: List[str]) -> List[Embedding]:
+    """
+    Embeds many questions with one batched provider call. The query models are
+    built with input_type="search_query", so their text batch endpoint returns
+    query embeddings.
+    """
+    if isinstance(embed_model, CachedEmbedding):
+        return await embed_model.aget_query_embedding_batch(queries)
+    return await embed_model.aget_text_embedding_batch(queries)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(path: str) -> EmbeddingStore:
+    """One EmbeddingStore per file, shared by the doc and query models."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            logging.info(f"Opening embedding cache at {path}")
+            store = _stores[path] = EmbeddingStore(path)
+        return store
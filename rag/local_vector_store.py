@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+
+class _Vector:
+    def __init__(self, id, values, metadata):
+        self.id = id
+        self.values = values
+        self.metadata = metadata
+
+
+class _Match(_Vector):
+    def __init__(self, id, score, values, metadata):
+        super().__init__(id, values, metadata)
+        self.score = score
+
+
+class _QueryResponse:
+    def __init__(self, matches, namespace):
+        self.matches = matches
+        self.namespace = namespace
+
+
+class _FetchResponse:
+    def __init__(self, vectors, namespace):
+        self.vectors = vectors
+        self.namespace = namespace
+
+
+def _matches_filter(metadata: dict, flt: dict) -> bool:
+    """Evaluates the subset of Pinecone's metadata filter language we use."""
+    for key, condition in flt.items():
+        if key == "$and":
+            if not all(_matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches_filter(metadata, sub) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+    return True
+
+
+class _Namespace:
+    """One namespace: a row-normalized float32 matrix plus parallel ids and metadata."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids = []
+        self.metadata = []
+        self.matrix = None
+        self.raw_norms = None
+        self._load()
+
+    @property
+    def _matrix_file(self):
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def _meta_file(self):
+        return os.path.join(self.path, "meta.json")
+
+    def _load(self):
+        if not os.path.exists(self._meta_file):
+            return
+        with open(self._meta_file) as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.metadata = meta["metadata"]
+        self.raw_norms = np.asarray(meta["norms"], dtype=np.float32)
+        if self.ids:
+            self.matrix = np.load(self._matrix_file, mmap_mode="r")
+
+    def _persist(self, matrix, ids, metadata, raw_norms):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_matrix = self._matrix_file + ".tmp.npy"
+        tmp_meta = self._meta_file + ".tmp"
+        np.save(tmp_matrix, matrix)
+        with open(tmp_meta, "w") as f:
+            json.dump({"ids": ids, "metadata": metadata, "norms": raw_norms.tolist()}, f)
+        os.replace(tmp_matrix, self._matrix_file)
+        os.replace(tmp_meta, self._meta_file)
+        self.ids, self.metadata, self.raw_norms = ids, metadata, raw_norms
+        self.matrix = np.load(self._matrix_file, mmap_mode="r") if ids else None
+
+    def upsert(self, vectors):
+        positions = {vector_id: i for i, vector_id in enumerate(self.ids)}
+        ids, metadata = list(self.ids), list(self.metadata)
+        rows = [np.asarray(self.matrix[i]) for i in range(len(ids))] if self.matrix is not None else []
+        norms = list(self.raw_norms) if self.raw_norms is not None else []
+        for vector_id, values, meta in vectors:
+            values = np.asarray(values, dtype=np.float32)
+            norm = float(np.linalg.norm(values))
+            row = values / norm if norm > 0 else values
+            if vector_id in positions:
+                i = positions[vector_id]
+                rows[i], metadata[i], norms[i] = row, meta, norm
+            else:
+                positions[vector_id] = len(ids)
+                ids.append(vector_id)
+                rows.append(row)
+                metadata.append(meta)
+                norms.append(norm)
+        self._persist(np.vstack(rows).astype(np.float32), ids, metadata, np.asarray(norms, dtype=np.float32))
+
+    def delete(self, ids_to_delete):
+        drop = set(ids_to_delete)
+        keep = [i for i, vector_id in enumerate(self.ids) if vector_id not in drop]
+        if len(keep) == len(self.ids):
+            return
+        if not keep:
+            self.clear()
+            return
+        self._persist(
+            np.asarray(self.matrix[keep], dtype=np.float32),
+            [self.ids[i] for i in keep],
+            [self.metadata[i] for i in keep],
+            self.raw_norms[keep],
+        )
+
+    def clear(self):
+        for path in (self._matrix_file, self._meta_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.ids, self.metadata, self.matrix, self.raw_norms = [], [], None, None
+
+    def values(self, i):
+        return (np.asarray(self.matrix[i]) * self.raw_norms[i]).tolist()
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index exposing the subset of the Pinecone `Index` API used by
+    insert_schema and PineconeVectorStore (upsert, query, fetch, list, delete,
+    describe_index_stats). Each namespace is a NumPy matrix memory-mapped from disk
+    and queried with brute-force cosine similarity.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._namespaces = {}
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if os.path.isdir(os.path.join(path, name)):
+                self._namespaces[name] = _Namespace(os.path.join(path, name))
+        logging.info(f"Local vector index loaded from {path} with {len(self._namespaces)} namespaces.")
+
+    def _namespace(self, namespace: str, create: bool = False):
+        namespace = namespace or "default"
+        if not re.fullmatch(r"[A-Za-z0-9_.\-]+", namespace):
+            raise ValueError(f"Invalid namespace for local vector index: {namespace}")
+        ns = self._namespaces.get(namespace)
+        if ns is None and create:
+            ns = self._namespaces[namespace] = _Namespace(os.path.join(self.path, namespace))
+        return ns
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            namespaces = {name: {"vector_count": len(ns.ids)} for name, ns in self._namespaces.items() if ns.ids}
+            dimension = next((ns.matrix.shape[1] for ns in self._namespaces.values() if ns.matrix is not None), 0)
+            return {
+                "namespaces": namespaces,
+                "dimension": dimension,
+                "total_vector_count": sum(v["vector_count"] for v in namespaces.values()),
+            }
+
+    def upsert(self, vectors, namespace: str = None, **kwargs):
+        entries = []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                entries.append((vector["id"], vector["values"], vector.get("metadata") or {}))
+            else:
+                vector_id, values, *rest = vector
+                entries.append((vector_id, values, rest[0] if rest else {}))
+        with self._lock:
+            if entries:
+                self._namespace(namespace, create=True).upsert(entries)
+        return {"upserted_count": len(entries)}
+
+    def query(self, vector, top_k: int = 10, namespace: str = None, filter: dict = None,
+              include_values: bool = False, include_metadata: bool = False, **kwargs):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or ns.matrix is None:
+                return _QueryResponse([], namespace)
+            candidates = np.arange(len(ns.ids))
+            if filter:
+                candidates = np.asarray([i for i in candidates if _matches_filter(ns.metadata[i], filter)], dtype=int)
+                if candidates.size == 0:
+                    return _QueryResponse([], namespace)
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+            scores = ns.matrix[candidates] @ query
+            k = min(top_k, scores.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = []
+            for j in top:
+                i = int(candidates[j])
+                matches.append(_Match(
+                    ns.ids[i],
+                    float(scores[j]),
+                    ns.values(i) if include_values else [],
+                    ns.metadata[i] if include_metadata else None,
+                ))
+            return _QueryResponse(matches, namespace)
+
+    def fetch(self, ids, namespace: str = None, **kwargs):
+        with self._lock:
+            ns = self._namespace(namespace)
+            vectors = {}
+            if ns is not None:
+                positions = {vector_id: i for i, vector_id in enumerate(ns.ids)}
+                for vector_id in ids:
+                    i = positions.get(vector_id)
+                    if i is not None:
+                        vectors[vector_id] = _Vector(vector_id, ns.values(i), ns.metadata[i])
+            return _FetchResponse(vectors, namespace)
+
+    def list(self, prefix: str = None, limit: int = 100, namespace: str = None, **kwargs):
+        with self._lock:
+            ns = self._namespace(namespace)
+            ids = [vector_id for vector_id in (ns.ids if ns else []) if not prefix or vector_id.startswith(prefix)]
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def delete(self, ids=None, delete_all: bool = False, namespace: str = None, filter: dict = None, **kwargs):
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return {}
+            if delete_all:
+                ns.clear()
+            elif filter:
+                ns.delete([vector_id for vector_id, meta in zip(ns.ids, ns.metadata) if _matches_filter(meta, filter)])
+            elif ids:
+                ns.delete(ids)
+            return {}
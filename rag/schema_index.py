@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from llama_index.vector_stores.pinecone import PineconeVectorStore
+
+from rag.schema_text import count_tokens, render_column_lines
+from rag.sql_validator import schema_catalog
+from utils.cache import LRUCache
+from utils.config import CONTEXT_CACHE_SIZE, SCHEMA_COLUMN_CHUNK_TOKENS, SCHEMA_COLUMN_TOP_K, SCHEMA_TABLE_TOP_K
+
+# Every table of a database lives in that database's namespace as one "table"
+# vector (name and column names, for picking tables) plus "columns" vectors
+# (groups of full column lines, for the LLM context). Each context adds one
+# "context" record holding its table list.
+NODE_METADATA_KEYS = ["table_name", "schema_hash", "kind", "column_groups", "group"]
+
+
+def index_namespace_of(namespace: str) -> str:
+    """The vector namespace a context ID was created under."""
+    return namespace.rsplit("_", 1)[0]
+
+
+def _table_vector_prefix(table_name: str) -> str:
+    """Stable, ASCII-safe vector ID prefix for a table's vectors."""
+    return hashlib.sha256(table_name.encode()).hexdigest()[:16]
+
+
+def table_vector_id(table_name: str) -> str:
+    return f"{_table_vector_prefix(table_name)}#table"
+
+
+def column_vector_id(table_name: str, group: int) -> str:
+    return f"{_table_vector_prefix(table_name)}#columns{group}"
+
+
+def _column_groups(table_name: str, lines: list, max_tokens: int) -> list:
+    """Packs column lines into texts of at most `max_tokens`, each under the table header."""
+    header = f"Table `{table_name}`:"
+    groups, current, size = [], [], count_tokens(header)
+    for line in lines:
+        tokens = count_tokens(line) + 1
+        if current and size + tokens > max_tokens:
+            groups.append(current)
+            current, size = [], count_tokens(header)
+        current.append(line)
+        size += tokens
+    if current or not groups:
+        groups.append(current)
+    return ["\n".join([header, *(f"  {line}" for line in group)]) for group in groups]
+
+
+def _node(vector_id: str, text: str, metadata: dict) -> TextNode:
+    return TextNode(
+        id_=vector_id,
+        text=text,
+        metadata=metadata,
+        excluded_embed_metadata_keys=NODE_METADATA_KEYS,
+        excluded_llm_metadata_keys=NODE_METADATA_KEYS,
+    )
+
+
+def build_table_nodes(table_name: str, schema, max_tokens: int = SCHEMA_COLUMN_CHUNK_TOKENS):
+    """
+    Returns (schema_hash, nodes) for one table: its table node followed by its
+    column group nodes, with deterministic IDs.
+    """
+    lines = render_column_lines(schema)
+    groups = _column_groups(table_name, lines, max_tokens)
+    schema_hash = hashlib.sha256("\n\n".join(groups).encode()).hexdigest()
+    column_names = ", ".join(dict.fromkeys(schema_catalog({table_name: schema})[table_name]))
+    metadata = {"table_name": table_name, "schema_hash": schema_hash}
+    nodes = [_node(
+        table_vector_id(table_name),
+        f"Table `{table_name}` with columns: {column_names}",
+        {**metadata, "kind": "table", "column_groups": len(groups)},
+    )]
+    nodes.extend(
+        _node(column_vector_id(table_name, i), text, {**metadata, "kind": "columns", "group": i})
+        for i, text in enumerate(groups)
+    )
+    return schema_hash, nodes
+
+
+def existing_table_vectors(pinecone_index, namespace: str, table_names) -> dict:
+    """
+    Reads back the table vectors of `table_names` by ID, so the cost does not
+    grow with the number of tables in the namespace.
+    Returns {table_name: {"schema_hash": str, "column_groups": int, "dimension": int}}.
+    """
+    table_names = list(table_names)
+    tables = {}
+    for start in range(0, len(table_names), 100):
+        ids = [table_vector_id(name) for name in table_names[start:start + 100]]
+        fetched = pinecone_index.fetch(ids=ids, namespace=namespace)
+        for vector in fetched.vectors.values():
+            metadata = vector.metadata or {}
+            if "table_name" in metadata:
+                tables[metadata["table_name"]] = {
+                    "schema_hash": metadata.get("schema_hash"),
+                    "column_groups": int(metadata.get("column_groups", 0)),
+                    "dimension": len(vector.values),
+                }
+    return tables
+
+
+# Pinecone caps metadata at 40 KB per vector, so a long table list is split
+# across several context records, each well under the cap.
+CONTEXT_RECORD_MAX_BYTES = 32 * 1024
+
+
+def context_record_id(namespace: str, part: int = 0) -> str:
+    return f"context#{namespace.rsplit('_', 1)[-1]}#{part}"
+
+
+def _split_tables(tables, max_bytes: int) -> list:
+    """Sorted table names in runs whose JSON encoding stays under `max_bytes`."""
+    parts, current, size = [], [], 0
+    for name in sorted(tables):
+        length = len(json.dumps(name).encode()) + 1
+        if current and size + length > max_bytes:
+            parts.append(current)
+            current, size = [], 0
+        current.append(name)
+        size += length
+    parts.append(current)
+    return parts
+
+
+def write_context_record(pinecone_index, namespace: str, tables, dimension: int,
+                         max_bytes: int = CONTEXT_RECORD_MAX_BYTES):
+    """
+    Stores a context's table list next to its tables, so it survives restarts
+    and cache evictions. Retrieval always filters on `kind`, so the records are
+    never returned as schema.
+    """
+    # Pinecone rejects all-zero dense vectors; the records' vectors are never queried.
+    values = [1.0] + [0.0] * (dimension - 1)
+    parts = _split_tables(tables, max_bytes)
+    # Part 0 says how many parts there are and marks the context as indexed, so it goes last.
+    for i in reversed(range(len(parts))):
+        pinecone_index.upsert(
+            vectors=[{
+                "id": context_record_id(namespace, i),
+                "values": values,
+                "metadata": {"kind": "context", "context_id": namespace, "part": i,
+                             "parts": len(parts), "tables": parts[i]},
+            }],
+            namespace=index_namespace_of(namespace),
+        )
+
+
+def read_context_tables(pinecone_index, namespace: str):
+    """Returns the table list of a context, or None if the context was never fully indexed."""
+    index_namespace = index_namespace_of(namespace)
+    fetched = pinecone_index.fetch(ids=[context_record_id(namespace)], namespace=index_namespace)
+    first = next(iter(fetched.vectors.values()), None)
+    if first is None:
+        return None
+    metadata = first.metadata or {}
+    parts = {0: list(metadata.get("tables", []))}
+    ids = [context_record_id(namespace, i) for i in range(1, int(metadata.get("parts", 1)))]
+    for start in range(0, len(ids), 100):
+        fetched = pinecone_index.fetch(ids=ids[start:start + 100], namespace=index_namespace)
+        for vector in fetched.vectors.values():
+            parts[int(vector.metadata["part"])] = list(vector.metadata.get("tables", []))
+    if len(parts) < len(ids) + 1:
+        logging.warning(f"Context record of {namespace} is incomplete in namespace {index_namespace}.")
+        return None
+    return [name for i in sorted(parts) for name in parts[i]]
+
+
+class ContextStore:
+    """
+    Table lists of contexts, read from their context records. A context ID is a
+    hash of its tables, so a record never changes and local copies do not expire.
+    Missing records are not cached, since the context may still be indexing.
+    """
+
+    def __init__(self, pinecone_index, max_entries: int = CONTEXT_CACHE_SIZE):
+        self._pinecone_index = pinecone_index
+        self._local = LRUCache(max_entries)
+
+    async def get(self, namespace: str):
+        tables = self._local.get(namespace)
+        if tables is None:
+            tables = await asyncio.to_thread(read_context_tables, self._pinecone_index, namespace)
+            if tables is not None:
+                self._local.put(namespace, tables)
+        return tables
+
+    def stats(self) -> dict:
+        return self._local.stats()
+
+
+class SchemaRetriever(BaseRetriever):
+    """
+    Two-stage retrieval from a database's table index, restricted to a context's
+    tables by metadata filter: the `table_top_k` most similar tables, then the
+    `column_top_k` most similar column groups among those tables. A picked table
+    with no ranked column group contributes its first one, so the LLM always
+    sees every table it was given. Expects the question's embedding on the bundle.
+    """
+
+    def __init__(self, pinecone_index, namespace: str, tables, *,
+                 table_top_k: int = SCHEMA_TABLE_TOP_K, column_top_k: int = SCHEMA_COLUMN_TOP_K):
+        super().__init__()
+        self._pinecone_index = pinecone_index
+        self._namespace = namespace
+        self._vector_store = PineconeVectorStore(pinecone_index=pinecone_index, namespace=namespace)
+        self._tables = sorted(tables)
+        self._table_top_k = table_top_k
+        self._column_top_k = column_top_k
+
+    def _query(self, embedding, kind: str, tables, top_k: int):
+        filters = [
+            MetadataFilter(key="kind", value=kind),
+            MetadataFilter(key="table_name", value=list(tables), operator=FilterOperator.IN),
+        ]
+        return self._vector_store.query(
+            VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k, filters=MetadataFilters(filters=filters)),
+            include_values=False,
+        )
+
+    def _select_tables(self, embedding) -> list:
+        if len(self._tables) <= self._table_top_k:
+            return self._tables
+        result = self._query(embedding, "table", self._tables, self._table_top_k)
+        return [node.metadata["table_name"] for node in result.nodes]
+
+    def _retrieve(self, query_bundle: QueryBundle):
+        if query_bundle.embedding is None:
+            raise ValueError("SchemaRetriever needs the question embedding on the query bundle.")
+        tables = self._select_tables(query_bundle.embedding)
+        if not tables:
+            return []
+        result = self._query(query_bundle.embedding, "columns", tables, self._column_top_k)
+        nodes = [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)]
+
+        covered = {node.node.metadata["table_name"] for node in nodes}
+        missing = [column_vector_id(name, 0) for name in tables if name not in covered]
+        if missing:
+            fetched = self._pinecone_index.fetch(ids=missing, namespace=self._namespace)
+            nodes.extend(
+                NodeWithScore(node=metadata_dict_to_node(vector.metadata), score=0.0)
+                for vector in fetched.vectors.values()
+            )
+            if len(fetched.vectors) < len(missing):
+                logging.warning(
+                    f"{len(missing) - len(fetched.vectors)} tables of the context are not indexed "
+                    f"in namespace {self._namespace}."
+                )
+
+        # Tables in ranking order, each table's column groups in schema order.
+        rank = {name: i for i, name in enumerate(tables)}
+        nodes.sort(key=lambda n: (rank.get(n.node.metadata["table_name"], len(rank)), n.node.metadata.get("group", 0)))
+        return nodes
+
+    async def _aretrieve(self, query_bundle: QueryBundle):
+        # The Pinecone client is synchronous; keep its round trips off the event loop.
+        return await asyncio.to_thread(self._retrieve, query_bundle)
@@ -0,0 +1,70 @@
+from llama_index.core.utils import get_tokenizer
+
+# Types whose precision and scale are meaningful to a reader; PostgreSQL also
+# reports a binary precision for integer and float columns.
+DECIMAL_TYPES = {"numeric", "decimal", "number"}
+
+
+def _field(record: dict, name: str):
+    """Reads a column attribute whatever case the driver returned its key in."""
+    return next((value for key, value in record.items() if key.lower() == name), None)
+
+
+def _integer(value):
+    """Catalog sizes as int; a DataFrame turns integer columns with nulls into floats."""
+    if value is None or value != value:
+        return None
+    return int(value)
+
+
+def _column_type(record: dict) -> str:
+    # MySQL's COLUMN_TYPE already carries length, precision and unsigned.
+    column_type = _field(record, "column_type") or _field(record, "data_type") or ""
+    length = _integer(_field(record, "character_maximum_length"))
+    precision, scale = _integer(_field(record, "numeric_precision")), _integer(_field(record, "numeric_scale"))
+    if length is not None:
+        return f"{column_type}({length})"
+    if precision is not None and column_type.lower() in DECIMAL_TYPES:
+        return f"{column_type}({precision},{scale})" if scale else f"{column_type}({precision})"
+    return column_type
+
+
+def render_column(record: dict, constraints=()) -> str:
+    """One DDL-like line for a column; attributes that are null or default are left out."""
+    parts = [str(_field(record, "column_name")), _column_type(record)]
+    nullable = _field(record, "is_nullable") or _field(record, "nullable")
+    if nullable in ("NO", "N"):
+        parts.append("NOT NULL")
+    parts.extend(constraints)
+    default = _field(record, "column_default")
+    if default is None:
+        default = _field(record, "data_default")
+    if default is not None and str(default).strip():
+        parts.append(f"DEFAULT {str(default).strip()}")
+    extra = _field(record, "extra")
+    if extra:
+        parts.append(str(extra).upper())
+    return " ".join(parts)
+
+
+def render_column_lines(columns: list) -> list:
+    """
+    One line per column of a table as extracted by ExtractSchema. A column the
+    catalog join lists once per constraint is folded into a single line.
+    """
+    order, constraints, records = [], {}, {}
+    for record in columns:
+        name = _field(record, "column_name")
+        if name not in records:
+            order.append(name)
+            records[name] = record
+            constraints[name] = []
+        constraint = _field(record, "constraint_type")
+        if constraint and constraint not in constraints[name]:
+            constraints[name].append(constraint)
+    return [render_column(records[name], constraints[name]) for name in order]
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` by the tokenizer SentenceSplitter sizes chunks with."""
+    return len(get_tokenizer()(text))
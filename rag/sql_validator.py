@@ -0,0 +1,183 @@
+import logging
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.scope import Scope, traverse_scope
+
+from utils.cache import LRUCache
+from utils.cache_tier import CacheTier, MemoryCacheTier
+from utils.config import SCHEMA_CATALOG_CACHE_SIZE, SCHEMA_CATALOG_CACHE_TTL
+
+SQL_DIALECTS = {"postgresql": "postgres", "mysql": "mysql", "oracle": "oracle"}
+
+# Identifiers the dialect resolves itself that never appear in a table's column list.
+PSEUDO_COLUMNS = {
+    "postgresql": set(),
+    "mysql": set(),
+    "oracle": {"rownum", "rowid", "level", "sysdate", "systimestamp", "user"},
+}
+
+# Tables every database of the dialect provides, which are never part of a context.
+SYSTEM_TABLES = {
+    "postgresql": set(),
+    "mysql": {"dual"},
+    "oracle": {"dual"},
+}
+
+MAX_LISTED_NAMES = 40
+
+
+def schema_catalog(combined_schema: dict) -> dict:
+    """Reduces extracted schema details to {table: [column names]}."""
+    catalog = {}
+    for table_name, columns in combined_schema.items():
+        names = []
+        for record in columns:
+            # The column name key depends on the driver: column_name or COLUMN_NAME.
+            name = next((value for key, value in record.items() if key.lower() == "column_name"), None)
+            if name is not None:
+                names.append(str(name))
+        catalog[table_name] = names
+    return catalog
+
+
+def _listing(names) -> str:
+    names = sorted(names)
+    shown = ", ".join(names[:MAX_LISTED_NAMES])
+    return shown + (f", ... ({len(names) - MAX_LISTED_NAMES} more)" if len(names) > MAX_LISTED_NAMES else "")
+
+
+def _resolve(scope: Scope, qualifier: str):
+    """Finds the source a table qualifier refers to, looking through enclosing scopes."""
+    while scope is not None:
+        for name, source in scope.sources.items():
+            if name.lower() == qualifier:
+                return source
+        scope = scope.parent
+    return None
+
+
+def validate_sql(sql: str, catalog: dict, db_type: str) -> list:
+    """
+    Parses `sql` in the namespace's dialect and checks every table and column
+    reference against `catalog` ({table: [columns]}). Returns a list of errors
+    worded for the LLM; empty means the query only uses known objects.
+    """
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=SQL_DIALECTS.get(db_type)) if s is not None]
+    except SqlglotError as e:
+        return [f"SQL syntax error: {e}"]
+    if not statements:
+        return ["SQL is empty."]
+
+    tables = {name.lower(): {column.lower() for column in columns} for name, columns in catalog.items()}
+    pseudo_columns = PSEUDO_COLUMNS.get(db_type, set())
+    system_tables = SYSTEM_TABLES.get(db_type, set())
+    errors = []
+
+    for statement in statements:
+        try:
+            scopes = traverse_scope(statement)
+        except SqlglotError as e:
+            errors.append(f"SQL could not be analysed: {e}")
+            continue
+
+        # Unqualified columns may legitimately come from any table or alias of the
+        # statement (correlated subqueries), so they are checked against all of them.
+        statement_columns, statement_aliases, opaque = set(), set(), False
+        for scope in scopes:
+            for source in scope.sources.values():
+                # Table functions (generate_series, json_table, ...) and system tables
+                # such as DUAL have no catalog entry; their columns cannot be checked.
+                if isinstance(source, exp.Table) and not isinstance(source.this, exp.Identifier):
+                    opaque = True
+                elif isinstance(source, exp.Table) and source.name.lower() in system_tables:
+                    opaque = True
+                elif isinstance(source, exp.Table):
+                    known = tables.get(source.name.lower())
+                    if known is None:
+                        errors.append(f"Unknown table `{source.name}`. Available tables: {_listing(catalog)}.")
+                        opaque = True
+                    else:
+                        statement_columns |= known
+                else:
+                    opaque = True
+            if isinstance(scope.expression, exp.Select):
+                statement_aliases |= {select.alias.lower() for select in scope.expression.selects if select.alias}
+
+        for scope in scopes:
+            for column in scope.columns:
+                if isinstance(column.this, exp.Star):
+                    continue
+                name = column.name.lower()
+                if column.table:
+                    source = _resolve(scope, column.table.lower())
+                    if source is None:
+                        errors.append(f"Column `{column.sql()}` refers to unknown table or alias `{column.table}`.")
+                    elif isinstance(source, exp.Table):
+                        known = tables.get(source.name.lower())
+                        if known is not None and name not in known:
+                            errors.append(
+                                f"Unknown column `{column.name}` in table `{source.name}`. "
+                                f"Its columns are: {_listing(catalog[_catalog_name(catalog, source.name)])}."
+                            )
+                elif not opaque and name not in statement_columns | statement_aliases | pseudo_columns:
+                    errors.append(f"Unknown column `{column.name}`: no table in the query has it.")
+
+    # The same mistake is usually repeated across clauses; report it once.
+    return list(dict.fromkeys(errors))
+
+
+def _catalog_name(catalog: dict, table_name: str) -> str:
+    lowered = table_name.lower()
+    return next(name for name in catalog if name.lower() == lowered)
+
+
+class SchemaStore:
+    """
+    Table and column names of each database namespace, read by SQL validation.
+    Columns are stored per table, so a table re-extracted for one context is seen
+    by every context over the same database. Backed by the shared cache tier so all
+    workers validate against the same schema; local copies of a context's catalog
+    are tagged with the namespace's generation, which every put() bumps.
+    """
+
+    def __init__(self, tier: CacheTier = None, max_entries: int = SCHEMA_CATALOG_CACHE_SIZE,
+                 ttl: float = SCHEMA_CATALOG_CACHE_TTL):
+        self.tier = tier or MemoryCacheTier()
+        self._local = LRUCache(max_entries, ttl=ttl)
+
+    async def put(self, index_namespace: str, combined_schema: dict):
+        for table, columns in schema_catalog(combined_schema).items():
+            await self.tier.aset_json(f"schema:{index_namespace}:{table}", columns)
+        await self.tier.aincr(f"schema-gen:{index_namespace}")
+
+    async def get(self, index_namespace: str, tables):
+        """Returns {table: [columns]} for a context's tables, or None if any of them was never stored."""
+        key = (index_namespace, tuple(tables))
+        try:
+            generation = await self.tier.aget(f"schema-gen:{index_namespace}")
+            cached = self._local.get(key)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+            catalog = {}
+            for table in tables:
+                columns = await self.tier.aget_json(f"schema:{index_namespace}:{table}")
+                if columns is not None:
+                    catalog[table] = columns
+        except Exception as e:
+            logging.warning(f"Could not read schema catalog for namespace {index_namespace}: {e}")
+            return None
+        if len(catalog) < len(tables):
+            # A partial catalog would reject valid SQL on the missing tables.
+            logging.warning(
+                f"No schema catalog for {len(tables) - len(catalog)} tables in namespace {index_namespace}; "
+                f"generated SQL will not be validated."
+            )
+            return None
+        self._local.put(key, (generation, catalog))
+        return catalog
+
+    def stats(self):
+        return self._local.stats()
@@ -0,0 +1,53 @@
+import asyncio
+
+import rag.QueryEngine as query_engine
+
+
+def test_cancelled_callers_keep_their_slot_until_generation_ends(monkeypatch):
+    concurrency = 2
+    in_flight = 0
+    peak = 0
+
+    async def fake_generate(llm_query, *args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.05)
+            return '{"sql": "SELECT 1"}'
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(query_engine, "_generate", fake_generate)
+
+    def ask(limiter, question):
+        return asyncio.create_task(query_engine.generate_query_engine(
+            question,
+            "postgresql_public__0123456789abcdef_fedcba9876543210",
+            pinecone_index=None,
+            llm=None,
+            embed_model_query=None,
+            query_engine_cache=None,
+            expected_output_key="sql",
+            tables=["orders"],
+            limiter=limiter,
+        ))
+
+    async def scenario():
+        limiter = asyncio.Semaphore(concurrency)
+        # A client starts a batch, then disconnects while its generations run.
+        first = [ask(limiter, f"question {i}") for i in range(4)]
+        await asyncio.sleep(0.01)
+        for task in first:
+            task.cancel()
+        # It retries with new questions while the abandoned ones are still running.
+        second = [ask(limiter, f"retry {i}") for i in range(4)]
+        await asyncio.sleep(0.01)
+        assert in_flight <= concurrency
+        await asyncio.gather(*second)
+        # Abandoned generations still finish in their flights.
+        while query_engine.generation_flights.stats()["in_flight"]:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert peak <= concurrency
@@ -0,0 +1,17 @@
+from db.pool import mysql_timeout_command
+
+
+def test_mysql_with_max_execution_time():
+    assert mysql_timeout_command("8.0.36", 30000) == "SET SESSION MAX_EXECUTION_TIME=30000"
+    assert mysql_timeout_command("5.7.8-log", 30000) == "SET SESSION MAX_EXECUTION_TIME=30000"
+
+
+def test_mariadb_uses_max_statement_time_in_seconds():
+    assert mysql_timeout_command("10.6.12-MariaDB", 30000) == "SET SESSION max_statement_time=30"
+    assert mysql_timeout_command("5.5.5-10.11.6-MariaDB-log", 1500) == "SET SESSION max_statement_time=1.5"
+
+
+def test_servers_without_a_session_timeout():
+    assert mysql_timeout_command("5.7.7", 30000) is None
+    assert mysql_timeout_command("5.6.51", 30000) is None
+    assert mysql_timeout_command("10.0.38-MariaDB", 30000) is None
@@ -0,0 +1,36 @@
+import json
+
+from rag.local_vector_store import LocalVectorIndex
+from rag.schema_index import read_context_tables, write_context_record
+
+NAMESPACE = "postgresql_public__0123456789abcdef_fedcba9876543210"
+INDEX_NAMESPACE = "postgresql_public__0123456789abcdef"
+PINECONE_METADATA_LIMIT = 40 * 1024
+
+
+def test_large_context_is_split_under_the_metadata_limit(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    tables = [f"reporting_snapshot_{'x' * 80}_{i:05d}" for i in range(5000)]
+
+    write_context_record(index, NAMESPACE, tables, dimension=8)
+
+    records = [
+        vector
+        for batch in index.list(prefix="context#", namespace=INDEX_NAMESPACE)
+        for vector in index.fetch(ids=batch, namespace=INDEX_NAMESPACE).vectors.values()
+    ]
+    assert len(records) > 1
+    for record in records:
+        assert len(json.dumps(record.metadata).encode()) < PINECONE_METADATA_LIMIT
+    assert read_context_tables(index, NAMESPACE) == sorted(tables)
+
+
+def test_small_context_is_one_record(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    write_context_record(index, NAMESPACE, ["orders", "customers"], dimension=8)
+    assert read_context_tables(index, NAMESPACE) == ["customers", "orders"]
+
+
+def test_missing_context_reads_as_none(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    assert read_context_tables(index, NAMESPACE) is None
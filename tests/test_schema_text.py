@@ -0,0 +1,23 @@
+from rag.schema_text import render_column_lines
+
+
+def test_sizes_from_a_dataframe_render_as_integers():
+    # extract_bulk_schema_details goes through pandas, which turns these into floats.
+    columns = [
+        {"column_name": "name", "data_type": "character varying", "is_nullable": "NO",
+         "character_maximum_length": 255.0, "numeric_precision": None, "numeric_scale": None},
+        {"column_name": "price", "data_type": "numeric", "is_nullable": "YES",
+         "character_maximum_length": None, "numeric_precision": 10.0, "numeric_scale": 2.0},
+        {"column_name": "qty", "data_type": "numeric", "is_nullable": "YES",
+         "character_maximum_length": None, "numeric_precision": 32.0, "numeric_scale": 0.0},
+    ]
+    assert render_column_lines(columns) == [
+        "name character varying(255) NOT NULL",
+        "price numeric(10,2)",
+        "qty numeric(32)",
+    ]
+
+
+def test_integer_sizes_are_unchanged():
+    columns = [{"column_name": "code", "data_type": "varchar", "character_maximum_length": 8}]
+    assert render_column_lines(columns) == ["code varchar(8)"]
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from utils.cache import LRUCache
+from utils.config import (
+    CACHE_BACKEND,
+    CACHE_SQLITE_PATH,
+    CACHE_REDIS_URL,
+    CACHE_KEY_PREFIX,
+    CACHE_MEMORY_MAX_ENTRIES,
+    CACHE_SQLITE_PURGE_INTERVAL,
+)
+
+
+class CacheTier:
+    """
+    Minimal key/value interface for state that every worker should see: string
+    values with an optional TTL, plus an atomic counter used for invalidation.
+    """
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: float = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def get_json(self, key: str):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value, ttl: float = None):
+        self.set(key, json.dumps(value, default=str), ttl=ttl)
+
+    # Async forms for callers on the event loop. SQLite and Redis block on I/O,
+    # so by default each call runs in a worker thread.
+
+    async def aget(self, key: str):
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: float = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def adelete(self, key: str):
+        await asyncio.to_thread(self.delete, key)
+
+    async def aincr(self, key: str) -> int:
+        return await asyncio.to_thread(self.incr, key)
+
+    async def aget_json(self, key: str):
+        value = await self.aget(key)
+        return json.loads(value) if value is not None else None
+
+    async def aset_json(self, key: str, value, ttl: float = None):
+        await self.aset(key, json.dumps(value, default=str), ttl=ttl)
+
+
+class MemoryCacheTier(CacheTier):
+    """
+    Process-local tier; the default when running a single worker. Counters are
+    kept apart from the LRU: an evicted generation would restart at 0 and bring
+    back entries cached before an invalidation.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MEMORY_MAX_ENTRIES):
+        self._entries = LRUCache(max_entries)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        counter = self._counters.get(key)
+        if counter is not None:
+            return str(counter)
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and time.time() > expires_at:
+            self._entries.invalidate(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._entries.put(key, (value, time.time() + ttl if ttl else None))
+
+    def delete(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+        self._entries.invalidate(key)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    # Nothing here blocks, so the async forms skip the thread hop.
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value, ttl=None):
+        self.set(key, value, ttl=ttl)
+
+    async def adelete(self, key):
+        self.delete(key)
+
+    async def aincr(self, key):
+        return self.incr(key)
+
+
+class SQLiteCacheTier(CacheTier):
+    """Tier shared by all workers on one host through a WAL-mode SQLite file."""
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, purge_interval: float = CACHE_SQLITE_PURGE_INTERVAL):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._purge_interval = purge_interval
+        self._last_purge = time.time()
+
+    def _purge_expired(self):
+        # Expired rows are otherwise only removed when read again, and orphaned
+        # keys (old answer generations, finished jobs) never are. Caller holds the lock.
+        now = time.time()
+        if now - self._last_purge < self._purge_interval:
+            return
+        self._last_purge = now
+        deleted = self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,)).rowcount
+        if deleted:
+            logging.info(f"Purged {deleted} expired entries from the SQLite cache tier.")
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and time.time() > expires_at:
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl if ttl else None),
+            )
+            self._purge_expired()
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def incr(self, key):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, '1', NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                (key,),
+            )
+            value = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0]
+            self._conn.commit()
+            return int(value)
+
+
+class RedisCacheTier(CacheTier):
+    """
+    Tier backed by any Redis-protocol server. A client object can be passed in,
+    e.g. one pointed at a local stand-in server for tests.
+    """
+
+    def __init__(self, url: str = CACHE_REDIS_URL, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self._client = client
+
+    def get(self, key):
+        value = self._client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def incr(self, key):
+        return int(self._client.incr(key))
+
+
+class PrefixedCacheTier(CacheTier):
+    """Namespaces every key so several deployments can share one backend."""
+
+    def __init__(self, tier: CacheTier, prefix: str):
+        self._tier = tier
+        self._prefix = prefix
+
+    def get(self, key):
+        return self._tier.get(self._prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self._tier.set(self._prefix + key, value, ttl=ttl)
+
+    def delete(self, key):
+        self._tier.delete(self._prefix + key)
+
+    def incr(self, key):
+        return self._tier.incr(self._prefix + key)
+
+    async def aget(self, key):
+        return await self._tier.aget(self._prefix + key)
+
+    async def aset(self, key, value, ttl=None):
+        await self._tier.aset(self._prefix + key, value, ttl=ttl)
+
+    async def adelete(self, key):
+        await self._tier.adelete(self._prefix + key)
+
+    async def aincr(self, key):
+        return await self._tier.aincr(self._prefix + key)
+
+
+def get_cache_tier() -> CacheTier:
+    if CACHE_BACKEND == "memory":
+        tier = MemoryCacheTier()
+    elif CACHE_BACKEND == "sqlite":
+        tier = SQLiteCacheTier(CACHE_SQLITE_PATH)
+    elif CACHE_BACKEND == "redis":
+        tier = RedisCacheTier(CACHE_REDIS_URL)
+    else:
+        raise ValueError(f"Unsupported cache backend: {CACHE_BACKEND}")
+    logging.info(f"Using {CACHE_BACKEND} cache tier.")
+    return PrefixedCacheTier(tier, CACHE_KEY_PREFIX)
@@ -7,6 +7,12 @@ load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = "tableindex"
 
+# Vector store backend: "pinecone" or "local" (in-process NumPy index persisted on disk)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", ".vector_store")
+# Worker processes, as read by gunicorn (see Procfile/Dockerfile)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
 # Groq
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -25,4 +31,81 @@ CORS_ALLOWED_ORIGINS = [
     "https://*.vercel.app",
     "https://txt2sql-gamma.vercel.app",
 ]
-TIMEOUT_SECONDS = 20
+
+# Deadlines
+TIMEOUT_SECONDS = int(os.getenv("TIMEOUT_SECONDS", "20"))  # client-side deadline for one /query_sql execution
+STATEMENT_TIMEOUT_SECONDS = int(os.getenv("STATEMENT_TIMEOUT_SECONDS", str(TIMEOUT_SECONDS)))  # enforced by the database server
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "10"))
+VECTOR_QUERY_TIMEOUT_SECONDS = float(os.getenv("VECTOR_QUERY_TIMEOUT_SECONDS", "10"))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))  # seconds between client disconnect checks
+CANCEL_TIMEOUT_SECONDS = float(os.getenv("CANCEL_TIMEOUT_SECONDS", "5"))  # connecting and sending KILL QUERY on cancellation
+QUERY_STREAM_TIMEOUT_SECONDS = int(os.getenv("QUERY_STREAM_TIMEOUT_SECONDS", "300"))  # deadline for a whole streamed /query_sql response
+
+# Database connection pools
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_IDLE_TIMEOUT = int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_HEALTH_CHECK_INTERVAL = int(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# SQL result delivery
+QUERY_STREAM_CHUNK_SIZE = int(os.getenv("QUERY_STREAM_CHUNK_SIZE", "1000"))
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", "10000"))
+
+# Cost guard for /query_sql: "off", "warn" (log and report) or "reject" plans above the limits
+COST_GUARD_MODE = os.getenv("COST_GUARD_MODE", "warn").lower()
+COST_GUARD_MAX_COST = float(os.getenv("COST_GUARD_MAX_COST", "1000000"))  # optimizer cost units
+COST_GUARD_MAX_ROWS = float(os.getenv("COST_GUARD_MAX_ROWS", "10000000"))  # estimated rows
+QUERY_ROW_CAP = int(os.getenv("QUERY_ROW_CAP", "100000"))  # appended to unbounded SELECTs, 0 disables
+
+# Background indexing jobs
+INDEXING_WORKERS = int(os.getenv("INDEXING_WORKERS", "2"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "500"))
+JOB_STATUS_TTL = int(os.getenv("JOB_STATUS_TTL", "86400"))  # seconds a job snapshot stays in the shared tier
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))
+
+# Query engine cache
+QUERY_ENGINE_CACHE_SIZE = int(os.getenv("QUERY_ENGINE_CACHE_SIZE", "256"))
+QUERY_ENGINE_CACHE_TTL = int(os.getenv("QUERY_ENGINE_CACHE_TTL", "3600"))  # seconds, 0 disables expiry
+
+# Schema retrieval: the context's most relevant tables first, then their most relevant
+# column groups. A column group is sized to what Cohere embeds without truncation.
+SCHEMA_TABLE_TOP_K = int(os.getenv("SCHEMA_TABLE_TOP_K", "5"))
+SCHEMA_COLUMN_TOP_K = int(os.getenv("SCHEMA_COLUMN_TOP_K", "10"))
+SCHEMA_COLUMN_CHUNK_TOKENS = int(os.getenv("SCHEMA_COLUMN_CHUNK_TOKENS", "512"))
+
+# /query_batch: questions per request (one embedding call covers up to 96) and
+# generations in flight across all batches, to stay inside the LLM provider's rate limits
+QUERY_BATCH_MAX_QUESTIONS = int(os.getenv("QUERY_BATCH_MAX_QUESTIONS", "96"))
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+
+# Answer cache for generated SQL
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))  # per namespace
+ANSWER_CACHE_MAX_NAMESPACES = int(os.getenv("ANSWER_CACHE_MAX_NAMESPACES", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # seconds an answer stays in the shared tier
+
+# Persistent embedding cache
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+
+# Table catalog cache for /list_tables
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "60"))  # seconds before revalidating
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+
+# Schema catalog used to validate generated SQL
+SCHEMA_CATALOG_CACHE_SIZE = int(os.getenv("SCHEMA_CATALOG_CACHE_SIZE", "256"))
+SCHEMA_CATALOG_CACHE_TTL = int(os.getenv("SCHEMA_CATALOG_CACHE_TTL", "60"))  # seconds a worker keeps its local copy
+# Context table lists read back from the vector index; they never change, so they do not expire.
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "1024"))
+
+# Shared cache tier: "memory" (per process), "sqlite" (shared file, one host) or "redis"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", ".cache/shared_cache.sqlite3")
+CACHE_SQLITE_PURGE_INTERVAL = int(os.getenv("CACHE_SQLITE_PURGE_INTERVAL", "300"))  # seconds between expired-row purges
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "aurasql:")
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000"))
+
+# Precomputed recommendations
+RECOMMENDATIONS_TTL = int(os.getenv("RECOMMENDATIONS_TTL", "604800"))  # seconds recommendations stay in the shared tier
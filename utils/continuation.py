@@ -0,0 +1,26 @@
+import base64
+import hashlib
+import json
+
+
+def _query_digest(query: str) -> str:
+    return hashlib.sha256(query.strip().encode()).hexdigest()[:16]
+
+
+def encode_token(query: str, offset: int, page_size: int) -> str:
+    """Builds an opaque token pointing at the next page of a query's results."""
+    payload = json.dumps({"q": _query_digest(query), "o": offset, "n": page_size}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str, query: str) -> tuple[int, int]:
+    """Returns (offset, page_size) from a token, checking it belongs to this query."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset, page_size = int(payload["o"]), int(payload["n"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid continuation token.") from e
+    if payload.get("q") != _query_digest(query):
+        raise ValueError("Continuation token does not match the query.")
+    return offset, page_size
@@ -91,4 +91,7 @@ Your output should strictly be in JSON format as follows:
 Given the database schema, generate a list of actionable SQL query recommendations. Ensure the recommendations are relevant, specific, and useful for decision-making, strictly adhering to the provided schema.
 Generate at least 15-20 actionable insights based on the provided context.
 And only focus on generating insights without any additional explanations or text.
-"""
\ No newline at end of file
+"""
+
+# Short text used for schema retrieval; the prompt above only goes to the LLM.
+retrieval_query = "Database tables with their columns, data types, keys and relationships."
@@ -0,0 +1,48 @@
+import io
+import json
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+
+RESULT_FORMATS = ("records", "columnar", "arrow")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def rows_to_records(columns, rows):
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def rows_to_columnar(columns, rows):
+    """Transposes driver rows into one value list per column."""
+    if not rows:
+        return [[] for _ in columns]
+    return [list(values) for values in zip(*rows)]
+
+
+def _arrow_array(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed or driver-specific types: fall back to their string form.
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def rows_to_arrow_ipc(columns, rows) -> bytes:
+    """Encodes driver rows as an Arrow IPC stream."""
+    arrays = [_arrow_array(values) for values in rows_to_columnar(columns, rows)]
+    if not arrays:
+        table = pa.table({})
+    else:
+        table = pa.Table.from_arrays(arrays, names=[str(column) for column in columns])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def ndjson_line(payload) -> str:
+    return json.dumps(jsonable_encoder(payload)) + "\n"
+
+
+def sse_event(event: str, payload) -> str:
+    """Formats one Server-Sent Events message with a JSON data field."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(payload))}\n\n"
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the work,
+    later callers await the same in-flight task and receive its result or error.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def _finished(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logging.debug(f"{self.name} flight {key!r} failed: {task.exception()}")
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+            logging.info(f"Joining in-flight {self.name} for key: {key!r}")
+        # Shielded so one caller going away does not cancel the work for the others.
+        return await asyncio.shield(task)
+
+    def __contains__(self, key) -> bool:
+        return key in self._inflight
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "executed": self.executed, "coalesced": self.coalesced}